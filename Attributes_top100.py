@@ -1,8 +1,15 @@
 import os
+import json
+import hashlib
+import threading
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy import Integer
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from urllib.parse import quote_plus
-import re
+from listing_keys import extract_asin, create_listing_key_index
+from segments import Segment, run_segments, refine_brand, normalize_facets, FACET_COLUMNS
+from similarity import add_similar_ranks
 
 # -------------------------------------
 # DB Setup
@@ -20,7 +27,7 @@ engine = create_engine(f"postgresql://{user}:{password}@{host}:{port}/{db}")
 # Final Column Order (includes parsed specs)
 # -------------------------------------
 final_columns = [
-    "URL", "Brand", "Product Name", "Model Number", "Price", "Ratings", "Discount",
+    "URL", "ASIN", "Brand", "Product Name", "Model Number", "Price", "Ratings", "Discount",
     "Band Colour", "Band Material", "Band Width", "Case Diameter",
     "Case Material", "Case Thickness", "Dial Colour", "Crystal Material",
     "Case Shape", "Movement", "Water Resistance Depth", "Special Features",
@@ -32,6 +39,7 @@ final_columns = [
 # -------------------------------------
 column_mapping = {
     "url": "URL",
+    "asin": "ASIN",
     "brand": "Brand",
     "product_name": "Product Name",
     "model_number": "Model Number",  # optional
@@ -63,71 +71,221 @@ def parse_specs(spec_str):
     return specs
 
 # -------------------------------------
-# Fill missing values from filled table
+# Parsed specs cache (JSONB)
 # -------------------------------------
-def apply_fallback_specs(final_df: pd.DataFrame, filled_table_name: str, engine, key_col="URL") -> pd.DataFrame:
-    filled_df = pd.read_sql_table(filled_table_name, con=engine)
-
-    # Rename columns from snake_case or strange names to match final_df
-    rename_map = {
-        "url": "URL",
-        "brand": "Brand",
-        "model_number": "Model Number",
-        "product_name": "Product Name",
-        "ratings": "Ratings",
-        "rating(out_of_5)": "Ratings",       # 👈 fix for actual Supabase column
-        "price": "Price",
-        "discount": "Discount",
-        "discount_(%)": "Discount",         # 👈 fix for actual Supabase column
-        "band_colour": "Band Colour",
-        "band_material": "Band Material",
-        "band_width": "Band Width",
-        "case_diameter": "Case Diameter",
-        "case_material": "Case Material",
-        "case_thickness": "Case Thickness",
-        "dial_colour": "Dial Colour",
-        "crystal_material": "Crystal Material",
-        "case_shape": "Case Shape",
-        "movement": "Movement",
-        "water_resistance_depth": "Water Resistance Depth",
-        "special_features": "Special Features",
-        "imageurl": "ImageURL"
-    }
-
-    filled_df.rename(columns=rename_map, inplace=True)
-
-    # Merge original and filled datasets
-    merged_df = final_df.merge(filled_df, on=key_col, how="left", suffixes=("", "_filled"))
-
-    # For all columns in final_df, try to fill from *_filled
-    for col in final_df.columns:
-        filled_col = f"{col}_filled"
-        if filled_col in merged_df.columns:
-            merged_df[col] = merged_df[col].where(
-                merged_df[col].notna() & (merged_df[col] != ""),
-                merged_df[filled_col]
+# Every key/value pair of a specs blob is stored once per blob hash, so re-runs only
+# parse blobs that changed. Bump the version whenever parse_specs changes behaviour.
+SPECS_CACHE_TABLE = "watch_specs_parsed"
+SPECS_PARSER_VERSION = "1"
+
+# Hashes looked up by this run (all segments); anything else is pruned once every segment is done
+_seen_spec_hashes = set()
+_seen_lock = threading.Lock()
+
+def specs_hash(spec_str):
+    if pd.isna(spec_str):
+        return None
+    return hashlib.md5(f"{SPECS_PARSER_VERSION}\n{spec_str}".encode("utf-8")).hexdigest()
+
+def create_specs_cache(engine):
+    # Run once before segments are processed concurrently
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SPECS_CACHE_TABLE} (spec_hash TEXT PRIMARY KEY, specs JSONB NOT NULL)"
+        ))
+
+def parse_specs_cached(specs: pd.Series, engine) -> pd.Series:
+    hashes = specs.map(specs_hash)
+    unique_hashes = list(hashes.dropna().unique())
+    with _seen_lock:
+        _seen_spec_hashes.update(unique_hashes)
+
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text(f"SELECT spec_hash, specs FROM {SPECS_CACHE_TABLE} WHERE spec_hash = ANY(:hashes)"),
+            {"hashes": unique_hashes}
+        ).all()
+    cached = {spec_hash: spec_dict for spec_hash, spec_dict in rows}
+
+    new_specs = {}
+    for spec_hash, spec_str in zip(hashes, specs):
+        if spec_hash is not None and spec_hash not in cached and spec_hash not in new_specs:
+            new_specs[spec_hash] = parse_specs(spec_str)
+
+    if new_specs:
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {SPECS_CACHE_TABLE} (spec_hash, specs) VALUES (:spec_hash, CAST(:specs AS JSONB)) "
+                     "ON CONFLICT (spec_hash) DO NOTHING"),
+                [{"spec_hash": h, "specs": json.dumps(spec_dict)} for h, spec_dict in new_specs.items()]
             )
+    cached.update(new_specs)
 
-    # Drop any *_filled columns
-    merged_df.drop(columns=[col for col in merged_df.columns if col.endswith("_filled")], inplace=True)
+    print(f"🗂️ Specs: parsed {len(new_specs)}, reused {len(unique_hashes) - len(new_specs)} from {SPECS_CACHE_TABLE}")
+    return hashes.map(lambda h: cached.get(h, {}))
 
-    return merged_df
+def prune_specs_cache(engine):
+    # Drop cached specs whose blob no longer appears in any source table (or predates a parser bump)
+    with _seen_lock:
+        keep = list(_seen_spec_hashes)
+    with engine.begin() as conn:
+        deleted = conn.execute(
+            text(f"DELETE FROM {SPECS_CACHE_TABLE} WHERE NOT (spec_hash = ANY(:hashes))"),
+            {"hashes": keep}
+        ).rowcount
+    print(f"🗂️ Specs: pruned {deleted} stale rows from {SPECS_CACHE_TABLE}")
 
-##brand info
+def create_specs_gin_index(engine, table_name: str, specs_col="Specs"):
+    # jsonb_path_ops serves containment filters like "Specs" @> '{"Crystal Material": "Sapphire"}'
+    index_name = f"ix_{table_name}_{specs_col}_gin".lower().replace(" ", "_")[:63]
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" USING GIN ("{specs_col}" jsonb_path_ops)'
+        ))
 
-def extract_brand_conditionally(row):
-    product_name = str(row["Product Name"]).lower()
-    brand = str(row["Brand"]).lower()
+def create_filter_indexes(engine, table_name: str, columns):
+    with engine.begin() as conn:
+        existing = {row[0] for row in conn.execute(
+            text("SELECT column_name FROM information_schema.columns WHERE table_name = :table"),
+            {"table": table_name}
+        )}
+        for col in columns:
+            if col not in existing:
+                continue
+            index_name = f"ix_{table_name}_{col}".lower().replace(" ", "_").replace("(", "").replace(")", "")[:63]
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ("{col}")'))
+
+def create_search_index(engine, table_name: str, search_col="Search Text"):
+    # Trigram GIN index: serves "Search Text" LIKE '%term%' from the dashboard
+    index_name = f"ix_{table_name}_search_trgm".lower().replace(" ", "_")[:63]
+    with engine.begin() as conn:
+        # Segments run concurrently and CREATE EXTENSION IF NOT EXISTS can race itself
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('pg_trgm'))"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" USING GIN ("{search_col}" gin_trgm_ops)'
+        ))
+
+# -------------------------------------
+# Fill missing values from filled table
+# -------------------------------------
+# Rename columns from snake_case or strange names to match final_df
+FALLBACK_RENAME_MAP = {
+    "url": "URL",
+    "asin": "ASIN",
+    "brand": "Brand",
+    "model_number": "Model Number",
+    "product_name": "Product Name",
+    "ratings": "Ratings",
+    "rating(out_of_5)": "Ratings",       # 👈 fix for actual Supabase column
+    "price": "Price",
+    "discount": "Discount",
+    "discount_(%)": "Discount",         # 👈 fix for actual Supabase column
+    "band_colour": "Band Colour",
+    "band_material": "Band Material",
+    "band_width": "Band Width",
+    "case_diameter": "Case Diameter",
+    "case_material": "Case Material",
+    "case_thickness": "Case Thickness",
+    "dial_colour": "Dial Colour",
+    "crystal_material": "Crystal Material",
+    "case_shape": "Case Shape",
+    "movement": "Movement",
+    "water_resistance_depth": "Water Resistance Depth",
+    "special_features": "Special Features",
+    "imageurl": "ImageURL"
+}
+
+def is_missing(series: pd.Series) -> pd.Series:
+    return series.isna() | (series == "")
+
+def load_fallback_index(filled_table_name: str, engine, keys: pd.Series, key_col="ASIN", chunksize=5000) -> pd.DataFrame:
+    """
+    Scans the filled table in chunks and keeps only the rows whose key is in `keys`,
+    so memory follows the size of the listing being processed, not the filled table.
+    Returns the rows indexed by key (first occurrence wins).
+    """
+    wanted = set(keys.dropna())
+    parts = []
+    for chunk in pd.read_sql_table(filled_table_name, con=engine, chunksize=chunksize):
+        chunk = chunk.rename(columns=FALLBACK_RENAME_MAP)
+        chunk = chunk.loc[:, ~chunk.columns.duplicated()].drop(columns=["source_url"], errors="ignore")
+        # Filled tables uploaded before the ASIN key existed only carry the full link
+        if key_col == "ASIN" and "ASIN" not in chunk.columns:
+            chunk["ASIN"] = extract_asin(chunk["URL"])
+        parts.append(chunk[chunk[key_col].isin(wanted)])
+
+    if not parts:
+        return pd.DataFrame(columns=[key_col]).set_index(key_col)
+
+    filled_df = pd.concat(parts, ignore_index=True)
+    filled_df = filled_df.drop_duplicates(subset=key_col, keep="first")
+    return filled_df.set_index(key_col)
+
+def apply_fallback_specs(final_df: pd.DataFrame, filled_table_name: str, engine, key_col="ASIN") -> pd.DataFrame:
+    final_df = final_df.copy()
+    keys = final_df[key_col]
+    fallback = load_fallback_index(filled_table_name, engine, keys, key_col=key_col)
+
+    # Columns that only exist in the filled table are carried over for every row
+    extra_cols = [col for col in fallback.columns if col not in final_df.columns]
+    shared_cols = [col for col in final_df.columns if col != key_col and col in fallback.columns]
+    for col in extra_cols:
+        final_df[col] = keys.map(fallback[col])
+
+    # Only look up rows that actually have a gap in the column
+    print(f"🧩 Fallback fill-rate from {filled_table_name}:")
+    for col in shared_cols:
+        gaps = is_missing(final_df[col])
+        n_gaps = int(gaps.sum())
+        if n_gaps == 0:
+            print(f"   {col}: no gaps")
+            continue
+
+        values = keys[gaps].map(fallback[col])
+        final_df.loc[gaps, col] = values
+        n_filled = int((~is_missing(values)).sum())
+        print(f"   {col}: {n_filled}/{n_gaps} gaps filled ({n_filled / n_gaps:.0%})")
+
+    return final_df
+
+# -------------------------------------
+# Unit normalization (vectorized)
+# -------------------------------------
+DIMENSION_COLUMNS = ["Band Width", "Case Diameter", "Case Thickness"]
+
+# Leading number (plain, decimal or 1.2E+1) followed by an optional unit word
+QUANTITY_PATTERN = r'^\s*(?P<num>\d+(?:\.\d+)?(?:e[+-]?\d+)?)\s*(?P<unit>[a-z"]+)?'
+
+LENGTH_UNITS_MM = {
+    "mm": 1.0, "millimeter": 1.0, "millimeters": 1.0, "millimetre": 1.0, "millimetres": 1.0,
+    "cm": 10.0, "centimeter": 10.0, "centimeters": 10.0, "centimetre": 10.0, "centimetres": 10.0,
+    "in": 25.4, "inch": 25.4, "inches": 25.4, '"': 25.4,
+}
+
+DEPTH_UNITS_M = {
+    "m": 1.0, "meter": 1.0, "meters": 1.0, "metre": 1.0, "metres": 1.0,
+    "cm": 0.01, "centimeter": 0.01, "centimeters": 0.01, "centimetre": 0.01, "centimetres": 0.01,
+    "mm": 0.001, "millimeter": 0.001, "millimeters": 0.001, "millimetre": 0.001, "millimetres": 0.001,
+    "ft": 0.3048, "foot": 0.3048, "feet": 0.3048,
+    "atm": 10.0, "bar": 10.0,
+}
+
+def to_unit(values: pd.Series, factors: dict, default_unit: str) -> pd.Series:
+    """
+    Converts strings like "4.2 Centimeters", "42 mm" or "42" to a float in the target unit.
+    A bare number is read as `default_unit`; unknown units and unparsable values give NaN.
+    """
+    parts = values.astype(str).str.strip().str.lower().str.extract(QUANTITY_PATTERN)
+    number = pd.to_numeric(parts["num"], errors="coerce")
+    factor = parts["unit"].fillna(default_unit).map(factors).astype(float)
+    return (number * factor).round(2)
+
+def format_millimeters(mm: pd.Series, original: pd.Series) -> pd.Series:
+    # "42.0" -> "42 Millimeters"; values we could not parse keep their original text
+    text = mm.astype(str).str.replace(r"\.0$", "", regex=True) + " Millimeters"
+    return text.astype(object).where(mm.notna(), original)
 
-    if "xylys" in product_name:
-        return "Titan XYLYS"
-    elif "edge" in product_name and "titan" in brand:
-        return "Titan Edge"
-    elif "raga" in product_name and "titan" in brand:
-        return "Titan Raga"
-    else:
-        return row["Brand"]
-    
 # -------------------------------------
 # Processing Function
 # -------------------------------------
@@ -138,8 +296,18 @@ def process_watch_table(source_table: str, filled_table: str, output_table: str)
 # Drop rows where 'product_name' contains "couple" (case-insensitive)
     
     df = df[~df["product_name"].str.contains("couple", case=False, na=False)]
+
+    # Listings scraped before the ASIN key existed only carry the full link
+    if "asin" not in df.columns:
+        df["asin"] = extract_asin(df["url"])
+    no_asin = is_missing(df["asin"])
+    if no_asin.any():
+        print(f"⚠️ {source_table}: {int(no_asin.sum())}/{len(df)} rows have no ASIN, no fallback specs for them")
+
+    # Same listing scraped twice (e.g. sponsored + organic slot): keep the best-ranked one
+    df = df[no_asin | ~df.duplicated(subset="asin", keep="first")]
     df = df.reset_index(drop=True)
-    parsed_specs = df['specs'].apply(parse_specs)
+    parsed_specs = parse_specs_cached(df['specs'], engine)
 
     structured_rows = []
     for i, spec_dict in enumerate(parsed_specs):
@@ -159,67 +327,65 @@ def process_watch_table(source_table: str, filled_table: str, output_table: str)
     # Create final DataFrame
     final_df = pd.DataFrame(structured_rows, columns=final_columns)
 
+    # Keep every parsed key/value pair, not just the whitelisted columns
+    final_df["Specs"] = parsed_specs.values
+
     # Fill missing specs from fallback table
     final_df = apply_fallback_specs(final_df, filled_table, engine)
 
     # Normalize brand using the conditional rules
-    final_df["Brand"] = final_df.apply(extract_brand_conditionally, axis=1)
+    final_df["Brand"] = refine_brand(final_df["Product Name"], final_df["Brand"])
 
     # ----------------------------
     # Normalize units consistently
     # ----------------------------
-    def normalize_dimension(value):
-        if pd.isna(value):
-            return value
-    
-        val = str(value).strip().lower()
-    
-        # Convert from centimeters to millimeters
-        if "centimeter" in val:
-            num = re.findall(r"[\d\.]+", val)
-            if num:
-                mm_value = float(num[0]) * 10
-                clean_val = int(mm_value) if mm_value.is_integer() else mm_value
-                return f"{clean_val} Millimeters"
-    
-        # Convert various forms of 'millimetre' or 'millimeter' to 'Millimeters'
-        if "millimeter" in val or "millimetre" in val:
-            num = re.findall(r"[\d\.]+", val)
-            if num:
-                val_float = float(num[0])
-                clean_val = int(val_float) if val_float.is_integer() else val_float
-                return f"{clean_val} Millimeters"
-    
-        # If just number, append Millimeters
-        if val.replace('.', '', 1).isdigit():
-            val_float = float(val)
-            clean_val = int(val_float) if val_float.is_integer() else val_float
-            return f"{clean_val} Millimeters"
-    
-        return value
+    for col in DIMENSION_COLUMNS:
+        final_df[f"{col} (mm)"] = to_unit(final_df[col], LENGTH_UNITS_MM, default_unit="mm")
+        final_df[col] = format_millimeters(final_df[f"{col} (mm)"], final_df[col])
+
+    final_df["Water Resistance Depth (m)"] = to_unit(final_df["Water Resistance Depth"], DEPTH_UNITS_M, default_unit="m")
+
+    # ----------------------------
+    # Publish filter-ready columns
+    # ----------------------------
+    final_df["Price"] = pd.to_numeric(
+        final_df["Price"].astype(str).str.replace(",", "", regex=False), errors="coerce"
+    ).fillna(0).astype(int)
+    final_df = normalize_facets(final_df)
 
-    # Apply to dimension columns
-    for col in ["Band Width", "Case Diameter", "Case Thickness"]:
-        final_df[col] = final_df[col].apply(normalize_dimension)
+    # Lower-cased name/model/brand/spec values, searched with pg_trgm in the dashboard's query mode
+    spec_text = final_df["Specs"].map(lambda specs: " ".join(str(value) for value in specs.values()))
+    final_df["Search Text"] = (
+        final_df[["Product Name", "Model Number", "Brand"]].fillna("").astype(str).agg(" ".join, axis=1)
+        + " " + spec_text
+    ).str.lower()
+
+    # Position in the Top 100 list; also the keyset for paginated dashboard queries
+    final_df.insert(0, "Rank", range(1, len(final_df) + 1))
+
+    # Precomputed "more like this" neighbours (as Ranks) for the Best Sellers cards
+    final_df = add_similar_ranks(final_df)
 
     # Upload final result
-    final_df.to_sql(output_table, con=engine, if_exists="replace", index=False)
+    final_df.to_sql(output_table, con=engine, if_exists="replace", index=False, dtype={"Specs": JSONB, "Similar Ranks": ARRAY(Integer)})
+    create_listing_key_index(engine, output_table, key_col="ASIN")
+    create_specs_gin_index(engine, output_table)
+    create_filter_indexes(engine, output_table, ["Rank", "Price", "Case Diameter (mm)", "price_band", *FACET_COLUMNS])
+    create_search_index(engine, output_table)
 
 
 # -------------------------------------
-# Run for Men and Women
+# Run for every segment
 # -------------------------------------
-if __name__ == "__main__":
+def process_segment(segment: Segment):
     process_watch_table(
-        source_table="top_100_men",
-        filled_table="top100_men_filled",
-        output_table="Final_Watch_Dataset_Men_output"
-    )
-
-    process_watch_table(
-        source_table="top_100_women",
-        filled_table="top100_women_filled",
-        output_table="Final_Watch_Dataset_Women_output"
+        source_table=segment.source_table,
+        filled_table=segment.filled_table,
+        output_table=segment.final_output
     )
 
 
+if __name__ == "__main__":
+    create_specs_cache(engine)
+    run_segments(process_segment)
+    prune_specs_cache(engine)  # only after every segment succeeded (run_segments re-raises failures)
@@ -3,6 +3,7 @@ import pandas as pd
 from sqlalchemy import create_engine
 from urllib.parse import quote_plus
 import re
+from segments import Segment, run_segments, categorize_price, refine_brand
 
 # -------------------------------------
 # DB Setup
@@ -124,120 +125,45 @@ def extract_product_code(product_name):
 
     return final_token.upper() if final_token else None
 
-def extract_brand_conditionally(row):
-    product_name = str(row["product_name"]).lower()
-    brand = str(row["brand"]).lower()
-
-    if "xylys" in product_name:
-        return "Titan XYLYS"
-    elif "edge" in product_name and "titan" in brand:
-        return "Titan Edge"
-    elif "raga" in product_name and "titan" in brand:
-        return "Titan Raga"
-    else:
-        return row["brand"]  # keep existing brand
-
 # -----------------------------
 # PART 3: Apply to Dataset and Save
 # -----------------------------
 
-df_men = pd.read_sql_table("top_100_men_excel", con=engine)
+def process_price_ranges(segment: Segment):
+    df = pd.read_sql_table(segment.top100_table, con=engine)
 
-# Drop rows where either "product_name" or "price" is null.
-df_men = df_men.dropna(subset=["product_name", "price"])
+    # Drop rows where either "product_name" or "price" is null.
+    df = df.dropna(subset=["product_name", "price"])
 
-# Update the DataFrame with extracted Product Code and Brand.
-df_men["product_code"] = df_men["product_name"].apply(extract_product_code)
-df_men["brand"] = df_men.apply(extract_brand_conditionally, axis=1)
+    # Drop repeat listings of the same ASIN (keeps the best-ranked one).
+    if "asin" in df.columns:
+        df = df[df["asin"].isna() | ~df.duplicated(subset="asin", keep="first")].copy()
 
-# -----------------------------
-# PART 3: Apply to Dataset and Save
-# -----------------------------
+    # Update the DataFrame with extracted Product Code and Brand.
+    df["product_code"] = df["product_name"].apply(extract_product_code)
+    df["brand"] = refine_brand(df["product_name"], df["brand"])
+    df["price_range"] = categorize_price(df["price"])
+
+    # Pivot table for product count per brand per price_range
+    brand_price_matrix = df.pivot_table(
+        index="brand",
+        columns="price_range",
+        values="product_name",
+        aggfunc="count",
+        fill_value=0
+    ).reset_index()
+
+    # Add total column
+    brand_price_matrix["total"] = brand_price_matrix.drop(columns=["brand"]).sum(axis=1)
+
+    # Optional: Reorder columns
+    ordered_cols = ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "<10k", "total"]
+    brand_price_matrix = brand_price_matrix.reindex(columns=[col for col in ordered_cols if col in brand_price_matrix.columns])
+    brand_price_matrix = brand_price_matrix.sort_values(by="total", ascending=False).reset_index(drop=True)
+
+    brand_price_matrix.to_sql(segment.price_range_output, con=engine, if_exists="replace", index=False)
+    return len(brand_price_matrix)
 
-# Read the Excel file.
-df_women = pd.read_sql_table("top_100_women_excel", con=engine)
-
-
-# Drop rows where either "product_name" or "price" is null.
-df_women = df_women.dropna(subset=["product_name", "price"])
-
-# Update the DataFrame with extracted Product Code and Brand.
-df_women["product_code"] = df_women["product_name"].apply(extract_product_code)
-df_women["brand"] = df_women.apply(extract_brand_conditionally, axis=1)
-
-
-def categorize_price(price):
-    if pd.isna(price):
-        return "Unknown"
-    price = float(price)
-    if price < 10000:
-        return "<10k"
-    elif price < 15000:
-        return "10k–15k"
-    elif price < 25000:
-        return "15k–25k"
-    elif price < 40000:
-        return "25k–40k"
-    else:
-        return "40k+"
-
-df_men["price_range"] = df_men["price"].apply(categorize_price)
-
-def categorize_price(price):
-    if pd.isna(price):
-        return "Unknown"
-    price = float(price)
-    if price < 10000:
-        return "<10k"
-    elif price < 15000:
-        return "10k–15k"
-    elif price < 25000:
-        return "15k–25k"
-    elif price < 40000:
-        return "25k–40k"
-    else:
-        return "40k+"
-
-df_women["price_range"] = df_women["price"].apply(categorize_price)
-
-# Pivot table for product count per brand per price_range
-brand_price_matrix_men = df_men.pivot_table(
-    index="brand",
-    columns="price_range",
-    values="product_name",
-    aggfunc="count",
-    fill_value=0
-).reset_index()
-
-# Add total column
-brand_price_matrix_men["total"] = brand_price_matrix_men.drop(columns=["brand"]).sum(axis=1)
-
-# Optional: Reorder columns
-ordered_cols = ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "<10k", "total"]
-brand_price_matrix_men = brand_price_matrix_men.reindex(columns=[col for col in ordered_cols if col in brand_price_matrix_men.columns])
-brand_price_matrix_men = brand_price_matrix_men.sort_values(by="total", ascending=False).reset_index(drop=True)
-
-# View result
-#print(brand_price_matrix_men.head())
-
-# Pivot table for product count per brand per price_range
-brand_price_matrix_women = df_women.pivot_table(
-    index="brand",
-    columns="price_range",
-    values="product_name",
-    aggfunc="count",
-    fill_value=0
-).reset_index()
-
-# Add total column
-brand_price_matrix_women["total"] = brand_price_matrix_women.drop(columns=["brand"]).sum(axis=1)
-
-# Optional: Reorder columns
-ordered_cols = ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "<10k", "total"]
-brand_price_matrix_women = brand_price_matrix_women.reindex(columns=[col for col in ordered_cols if col in brand_price_matrix_women.columns])
-
-brand_price_matrix_women = brand_price_matrix_women.sort_values(by="total", ascending=False).reset_index(drop=True)
-
-brand_price_matrix_men.to_sql("men_price_range_top100_output", con=engine, if_exists="replace", index=False)
-brand_price_matrix_women.to_sql("women_price_range_top100_output", con=engine, if_exists="replace", index=False)
 
+if __name__ == "__main__":
+    run_segments(process_price_ranges)
@@ -0,0 +1,114 @@
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from dashboard.search import tokenize
+
+# -------------------------------------
+# Query-backed Best Sellers catalog
+# -------------------------------------
+# Instead of pulling a whole Final_Watch_Dataset_* table into the session, the sidebar
+# filters become a parameterized WHERE on indexed columns and only the visible page is
+# fetched, using "Rank" as the keyset (WHERE "Rank" > last rank of previous page).
+
+KEY_COL = "Rank"
+SEARCH_COL = "Search Text"
+
+
+def quote(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+def build_where(selections=None, ranges=None, search=None):
+    """
+    Returns (where_sql, params, expanding) for {column: values} IN-filters,
+    {column: (low, high)} inclusive ranges and an optional search string (every token
+    must appear in "Search Text"; trigram-indexed). Column names come from the page's
+    own facet list; all values are bound parameters.
+    """
+    clauses, params, expanding = [], {}, []
+    for i, (col, selected) in enumerate(sorted((selections or {}).items())):
+        if selected:
+            name = f"facet_{i}"
+            clauses.append(f"{quote(col)} IN :{name}")
+            params[name] = list(selected)
+            expanding.append(name)
+    for i, (col, (low, high)) in enumerate(sorted((ranges or {}).items())):
+        clauses.append(f"{quote(col)} BETWEEN :range_{i}_low AND :range_{i}_high")
+        params[f"range_{i}_low"], params[f"range_{i}_high"] = low, high
+    for i, token in enumerate(tokenize(search or "")):
+        clauses.append(f"{quote(SEARCH_COL)} LIKE :search_{i}")
+        params[f"search_{i}"] = f"%{token}%"
+    return " AND ".join(clauses) or "TRUE", params, expanding
+
+
+def _statement(sql, expanding):
+    return text(sql).bindparams(*[bindparam(name, expanding=True) for name in expanding])
+
+
+def count_matches(engine, table, selections=None, ranges=None, search=None) -> int:
+    where, params, expanding = build_where(selections, ranges, search)
+    sql = f"SELECT COUNT(*) FROM {quote(table)} WHERE {where}"
+    with engine.connect() as conn:
+        return conn.execute(_statement(sql, expanding), params).scalar_one()
+
+
+def rank_at(engine, table, offset, selections=None, ranges=None, search=None):
+    # Keyset for a page we have not walked to yet (e.g. jumping straight to page 7);
+    # only reads the indexed key column.
+    where, params, expanding = build_where(selections, ranges, search)
+    sql = f"SELECT {quote(KEY_COL)} FROM {quote(table)} WHERE {where} ORDER BY {quote(KEY_COL)} OFFSET :offset LIMIT 1"
+    with engine.connect() as conn:
+        return conn.execute(_statement(sql, expanding), {**params, "offset": offset}).scalar_one_or_none()
+
+
+def fetch_page(engine, table, after_rank, page_size, selections=None, ranges=None, search=None) -> pd.DataFrame:
+    where, params, expanding = build_where(selections, ranges, search)
+    sql = (
+        f"SELECT * FROM {quote(table)} WHERE {where} AND {quote(KEY_COL)} > :after_rank "
+        f"ORDER BY {quote(KEY_COL)} LIMIT :page_size"
+    )
+    with engine.connect() as conn:
+        return pd.read_sql_query(
+            _statement(sql, expanding), conn,
+            params={**params, "after_rank": after_rank, "page_size": page_size}
+        )
+
+
+def fetch_by_ranks(engine, table, ranks, columns=None) -> pd.DataFrame:
+    # Point lookups on the indexed key column, e.g. a page's "Similar Ranks" neighbours
+    select = ", ".join(quote(col) for col in columns) if columns else "*"
+    sql = f"SELECT {select} FROM {quote(table)} WHERE {quote(KEY_COL)} IN :ranks"
+    with engine.connect() as conn:
+        return pd.read_sql_query(_statement(sql, ["ranks"]), conn, params={"ranks": [int(rank) for rank in ranks]})
+
+
+class CatalogSummary:
+    """
+    Sidebar options and numeric bounds read with one small query per column. Same read
+    interface as FacetIndex, without per-option counts.
+    """
+
+    def __init__(self, engine, table, facet_columns, range_columns=()):
+        self._values, self._bounds = {}, {}
+        existing = {column["name"] for column in inspect(engine).get_columns(table)}
+        facet_columns = [col for col in facet_columns if col in existing]
+        range_columns = [col for col in range_columns if col in existing]
+        with engine.connect() as conn:
+            for col in facet_columns:
+                rows = conn.execute(text(
+                    f"SELECT DISTINCT {quote(col)} FROM {quote(table)} WHERE {quote(col)} IS NOT NULL ORDER BY 1"
+                ))
+                self._values[col] = [row[0] for row in rows]
+            for col in range_columns:
+                self._bounds[col] = tuple(conn.execute(text(
+                    f"SELECT MIN({quote(col)}), MAX({quote(col)}) FROM {quote(table)}"
+                )).one())
+
+    def values(self, col):
+        return self._values.get(col, [])
+
+    def bounds(self, col):
+        return self._bounds.get(col, (None, None))
+
+    def facet_counts(self, selections=None, ranges=None, mask=None):
+        return {}
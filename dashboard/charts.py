@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# -------------------------------------
+# Ask Questions charts
+# -------------------------------------
+# Results can be thousands of rows, so charts are drawn from a reduced frame: line and
+# scatter charts keep evenly spaced points (first and last always included), bar charts
+# keep the first categories in query order and pie charts fold the tail into "Other".
+
+MAX_POINTS = 2000
+MAX_CATEGORIES = 30
+
+
+def downsample(df: pd.DataFrame, max_points=MAX_POINTS) -> pd.DataFrame:
+    if len(df) <= max_points:
+        return df
+    positions = np.unique(np.linspace(0, len(df) - 1, max_points).round().astype(int))
+    return df.iloc[positions]
+
+
+def fold_tail(df: pd.DataFrame, names, values, max_categories=MAX_CATEGORIES) -> pd.DataFrame:
+    if len(df) <= max_categories:
+        return df
+    head = df.iloc[:max_categories - 1][[names, values]]
+    other = pd.DataFrame({names: ["Other"], values: [pd.to_numeric(df[values].iloc[max_categories - 1:], errors="coerce").sum()]})
+    return pd.concat([head, other], ignore_index=True)
+
+
+def render_chart(df: pd.DataFrame, chart_type):
+    if df.empty:
+        return
+    reduced = True
+    if chart_type == "bar":
+        chart_df = df.head(MAX_CATEGORIES)
+        st.bar_chart(chart_df.set_index(chart_df.columns[0]))
+    elif chart_type == "line":
+        chart_df = downsample(df)
+        st.line_chart(chart_df.set_index(chart_df.columns[0]))
+    elif chart_type == "pie" and df.shape[1] >= 2:
+        import plotly.express as px  # only pie/scatter answers pay for plotly
+        chart_df = fold_tail(df, df.columns[0], df.columns[1])
+        st.plotly_chart(px.pie(chart_df, names=df.columns[0], values=df.columns[1]))
+    elif chart_type == "scatter" and df.shape[1] >= 2:
+        import plotly.express as px
+        chart_df = downsample(df)
+        st.plotly_chart(px.scatter(chart_df, x=df.columns[0], y=df.columns[1]))
+    else:
+        reduced = False
+    if reduced and len(chart_df) < len(df):
+        st.caption(f"Chart drawn from {len(chart_df):,} of {len(df):,} rows.")
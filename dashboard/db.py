@@ -0,0 +1,121 @@
+import threading
+from urllib.parse import quote_plus
+
+import streamlit as st
+from sqlalchemy import create_engine, event
+
+from dataset_version import get_dataset_version
+
+# -------------------------------------
+# Shared Supabase engine
+# -------------------------------------
+# Streamlit re-executes every page on each interaction, so pages must not build their own
+# engine. get_engine() returns one pooled engine per server process; pages borrow
+# connections from it and connection setup stays out of interaction latency.
+# get_query_engine() is a separate small pool for LLM-generated SQL: every session is
+# read-only (default_transaction_read_only) and it logs in as SQL_READONLY_USER when set,
+# so even SQL that slips past the guardrails cannot write.
+
+POOL_SIZE = 5
+QUERY_POOL_SIZE = 2
+MAX_OVERFLOW = 5
+POOL_TIMEOUT_S = 10
+POOL_RECYCLE_S = 1800
+STATEMENT_TIMEOUT_MS = 30000
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+
+    def bump(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def _watch_pool(engine, stats: PoolStats, statement_timeout_ms, read_only=False):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_conn, _record):
+        stats.bump("connects")
+        with dbapi_conn.cursor() as cursor:
+            cursor.execute(f"SET statement_timeout = {int(statement_timeout_ms)}")
+            if read_only:
+                cursor.execute("SET SESSION default_transaction_read_only = on")
+        dbapi_conn.commit()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(*_):
+        stats.bump("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(*_):
+        stats.bump("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(*_):
+        stats.bump("invalidations")
+
+
+def _create_engine(user, password, pool_size, max_overflow, read_only=False):
+    db = st.secrets["SUPABASE_DB"]
+    host = st.secrets["SUPABASE_HOST"]
+    port = st.secrets["SUPABASE_PORT"]
+
+    engine = create_engine(
+        f"postgresql://{user}:{quote_plus(password)}@{host}:{port}/{db}",
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=POOL_TIMEOUT_S,
+        pool_recycle=POOL_RECYCLE_S,
+        pool_pre_ping=True,
+        connect_args={"connect_timeout": 10},
+    )
+    engine.pool_stats = PoolStats()
+    _watch_pool(engine, engine.pool_stats, st.secrets.get("DB_STATEMENT_TIMEOUT_MS", STATEMENT_TIMEOUT_MS), read_only)
+    return engine
+
+
+@st.cache_resource
+def get_engine():
+    return _create_engine(
+        st.secrets["SUPABASE_USER"],
+        st.secrets["SUPABASE_PASSWORD"],
+        pool_size=int(st.secrets.get("DB_POOL_SIZE", POOL_SIZE)),
+        max_overflow=int(st.secrets.get("DB_MAX_OVERFLOW", MAX_OVERFLOW)),
+    )
+
+
+@st.cache_resource
+def get_query_engine():
+    # Prefer a role with SELECT-only grants; the read-only session is a backstop either way
+    return _create_engine(
+        st.secrets.get("SQL_READONLY_USER", st.secrets["SUPABASE_USER"]),
+        st.secrets.get("SQL_READONLY_PASSWORD", st.secrets["SUPABASE_PASSWORD"]),
+        pool_size=int(st.secrets.get("SQL_POOL_SIZE", QUERY_POOL_SIZE)),
+        max_overflow=0,
+        read_only=True,
+    )
+
+
+def pool_metrics(engine=None):
+    engine = engine or get_engine()
+    stats = engine.pool_stats
+    return {
+        "pool_size": engine.pool.size(),
+        "checked_out": engine.pool.checkedout(),
+        "overflow": engine.pool.overflow(),
+        "connects": stats.connects,
+        "checkouts": stats.checkouts,
+        "checkins": stats.checkins,
+        "invalidations": stats.invalidations,
+    }
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def current_dataset_version():
+    # Cheap single-row probe; caches keyed on its result reload once per pipeline publish
+    return get_dataset_version(get_engine())
@@ -0,0 +1,131 @@
+import re
+import threading
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from dashboard.guardrails import CHUNK_SIZE, MAX_ROWS, TIMEOUT_MS, GuardrailError, check_sql, collect, limit_sql, sql_words
+from dashboard.snapshots import ensure_snapshot
+
+# -------------------------------------
+# Embedded Ask Questions engine (DuckDB)
+# -------------------------------------
+# The *_output tables are small, read-only and only change when the pipeline publishes,
+# so they are loaded once per dataset version from the Arrow snapshots into an
+# in-process DuckDB database and generated SQL runs locally. A thin shim rewrites the
+# Postgres-only constructs the prompt asks for (JSONB containment, :name parameters).
+# Once the tables are loaded the database is cut off from the filesystem and network
+# (enable_external_access=false, locked), and DuckDB's file/table functions are blocked
+# on top of the Postgres guardrails, so generated SQL can only read the loaded tables.
+
+# "Specs"[::jsonb] @> '{"Crystal Material": "Sapphire"}'  ->  json_contains("Specs", '{...}')
+CONTAINMENT = re.compile(
+    r"((?:\"(?:[^\"]|\"\")+\"|\w+)(?:\.(?:\"(?:[^\"]|\"\")+\"|\w+))?)(?:\s*::\s*jsonb?)?\s*@>\s*('(?:[^']|'')*')(?:::jsonb?)?",
+    re.I,
+)
+# Raised for SQL DuckDB cannot run (dialect gaps); callers fall back to Postgres
+EmbeddedError = duckdb.Error
+
+# DuckDB functions/statements that reach outside the loaded tables
+DUCKDB_FORBIDDEN = re.compile(
+    r"^(read_\w+|\w+_scan|glob|attach|detach|install|load|pragma|export|import|checkpoint|use|"
+    r"getenv|current_setting|duckdb_\w+|pragma_\w+|sniff_csv|query|query_table|which_secret)$"
+)
+
+
+def check_duckdb_sql(sql):
+    """check_sql() plus DuckDB's own file, table and extension functions."""
+    statement = check_sql(sql)
+    blocked = sorted({word for word in sql_words(statement) if DUCKDB_FORBIDDEN.match(word)})
+    if blocked:
+        raise GuardrailError(f"Query uses a blocked keyword or function: {', '.join(blocked)}.")
+    return statement
+
+
+def to_frame(batch):
+    # DECIMAL columns (SUM, NUMERIC) come back as floats, like the Postgres path
+    table = pa.Table.from_batches([batch])
+    schema = pa.schema([
+        field.with_type(pa.float64()) if pa.types.is_decimal(field.type) else field for field in table.schema
+    ])
+    return table.cast(schema).to_pandas()
+
+# Applied outside quoted strings only
+REWRITES = [
+    (re.compile(r"::jsonb\b", re.I), "::json"),
+    (re.compile(r"\bjsonb_(\w+)\s*\(", re.I), r"json_\1("),
+    # :name bind parameters -> $name (leaves :: casts and x[:2] slices alone)
+    (re.compile(r"(?<![:\w\[]):(\w+)"), r"$\1"),
+]
+
+
+def to_duckdb_sql(sql):
+    sql = CONTAINMENT.sub(r"json_contains(\1, \2)", sql)
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    for i in range(0, len(parts), 2):
+        for pattern, replacement in REWRITES:
+            parts[i] = pattern.sub(replacement, parts[i])
+    return "".join(parts)
+
+
+class EmbeddedCatalog:
+    def __init__(self, engine, tables, version):
+        self.version = version
+        self.tables = []
+        self._db = duckdb.connect(":memory:")
+        for table in tables:
+            try:
+                snapshot = ensure_snapshot(engine, table, version)
+            except Exception as e:
+                print(f"❌ Embedded engine skipped {table}: {e}")
+                continue
+            self._db.register("snapshot_view", snapshot)
+            self._db.execute(f'CREATE TABLE "{table.replace(chr(34), chr(34) * 2)}" AS SELECT * FROM snapshot_view')
+            self._db.unregister("snapshot_view")
+            self.tables.append(table)
+        # From here on queries only see the tables above (no files, URLs, extensions or settings)
+        self._db.execute("SET enable_external_access = false")
+        self._db.execute("SET lock_configuration = true")
+
+    def stream(self, sql, params=None, timeout_ms=TIMEOUT_MS, max_rows=MAX_ROWS, chunk_size=CHUNK_SIZE):
+        """Same contract as guardrails.stream_guarded: read-only, timeout-bounded, at most max_rows + 1 rows."""
+        statement = to_duckdb_sql(limit_sql(check_duckdb_sql(sql), max_rows))
+        cursor = self._db.cursor()  # one connection per query; the tables are shared
+        timer = threading.Timer(timeout_ms / 1000, cursor.interrupt)
+        timer.start()
+        try:
+            batches = cursor.execute(statement, params or None).fetch_record_batch(chunk_size)
+            sent = False
+            for batch in batches:
+                sent = True
+                yield to_frame(batch)
+            if not sent:
+                yield to_frame(pa.RecordBatch.from_pylist([], schema=batches.schema))
+        except duckdb.InterruptException:
+            raise GuardrailError(f"Query did not finish within {timeout_ms / 1000:g}s.")
+        finally:
+            timer.cancel()
+            cursor.close()
+
+    def run(self, sql, params=None, **limits) -> pd.DataFrame:
+        return collect(self.stream(sql, params, **limits))
+
+
+# Regression cases: Postgres SQL from the prompt -> what DuckDB runs
+REWRITTEN = {
+    """SELECT 1 FROM t WHERE "Specs"::jsonb @> '{"Strap Color": "Black"}'::jsonb""":
+        """SELECT 1 FROM t WHERE json_contains("Specs", '{"Strap Color": "Black"}')""",
+    """SELECT 1 FROM t WHERE t."Specs" @> '{"a": 1}'""": """SELECT 1 FROM t WHERE json_contains(t."Specs", '{"a": 1}')""",
+    "SELECT arr[:2], arr[1:2], '::x' FROM t WHERE brand = :brand": "SELECT arr[:2], arr[1:2], '::x' FROM t WHERE brand = $brand",
+}
+
+
+def check():
+    for sql, expected in REWRITTEN.items():
+        assert to_duckdb_sql(sql) == expected, f"{sql!r} -> {to_duckdb_sql(sql)!r}"
+    print(f"✅ DuckDB shim: {len(REWRITTEN)} rewrites as expected")
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------
+# Facet bitmap index for Best Sellers
+# -------------------------------------
+# Built once per dataset: one packed bitmap per distinct value of every facet column and
+# a sorted copy of every numeric range column. A filter combination is then an OR of
+# bitmaps within a facet, an AND across facets and a binary search per range.
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+class FacetIndex:
+    def __init__(self, df: pd.DataFrame, facet_columns, range_columns=()):
+        self.size = len(df)
+        self.bitmaps = {}
+        for col in facet_columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col], sort=True)  # NaN -> -1
+            bits = np.zeros((len(uniques), self.size), dtype=bool)
+            rows = np.flatnonzero(codes >= 0)
+            bits[codes[rows], rows] = True
+            packed = np.packbits(bits, axis=1)
+            self.bitmaps[col] = {value: packed[i] for i, value in enumerate(uniques)}
+
+        self.sorted_ranges = {}
+        for col in range_columns:
+            if col not in df.columns:
+                continue
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            order = np.argsort(values, kind="stable")  # NaN sorts last
+            self.sorted_ranges[col] = (values[order], order)
+
+        self._all = np.packbits(np.ones(self.size, dtype=bool))
+        self._none = np.zeros_like(self._all)
+
+    def values(self, col):
+        return list(self.bitmaps.get(col, {}))
+
+    def bounds(self, col):
+        if col not in self.sorted_ranges:
+            return (None, None)
+        values, _ = self.sorted_ranges[col]
+        values = values[~np.isnan(values)]
+        return (values[0], values[-1]) if len(values) else (None, None)
+
+    def facet_bitmap(self, col, selected):
+        bitmaps = self.bitmaps.get(col, {})
+        result = self._none.copy()
+        for value in selected:
+            if value in bitmaps:
+                np.bitwise_or(result, bitmaps[value], out=result)
+        return result
+
+    def range_bitmap(self, col, low, high):
+        values, order = self.sorted_ranges[col]
+        start = np.searchsorted(values, low, side="left")
+        end = np.searchsorted(values, high, side="right")
+        bits = np.zeros(self.size, dtype=bool)
+        bits[order[start:end]] = True
+        return np.packbits(bits)
+
+    def bitmap_from_positions(self, positions):
+        bits = np.zeros(self.size, dtype=bool)
+        bits[positions] = True
+        return np.packbits(bits)
+
+    def match_bitmap(self, selections=None, ranges=None, mask=None):
+        """
+        selections: {facet column: selected values}; empty selections are ignored.
+        ranges: {range column: (low, high)}, both ends inclusive.
+        mask: optional extra bitmap (e.g. search hits) every row must be in.
+        """
+        result = self._all.copy() if mask is None else mask.copy()
+        for col, selected in (selections or {}).items():
+            if selected:
+                np.bitwise_and(result, self.facet_bitmap(col, selected), out=result)
+        for col, (low, high) in (ranges or {}).items():
+            np.bitwise_and(result, self.range_bitmap(col, low, high), out=result)
+        return result
+
+    def to_positions(self, bitmap):
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.size))
+
+    def match(self, selections=None, ranges=None, mask=None):
+        # Row positions in original (rank) order
+        return self.to_positions(self.match_bitmap(selections, ranges, mask))
+
+    def facet_counts(self, selections=None, ranges=None, mask=None):
+        """
+        {facet column: {value: matching rows}} where each facet is counted against the
+        ranges and every *other* active facet, so options show what picking them would give.
+        Uses prefix/suffix ANDs of the per-facet bitmaps, so cost is linear in facets.
+        """
+        selections = selections or {}
+        base = self.match_bitmap(ranges=ranges, mask=mask)
+        columns = list(self.bitmaps)
+        active = [
+            self.facet_bitmap(col, selections[col]) if selections.get(col) else self._all
+            for col in columns
+        ]
+
+        # prefix[i] = AND of active[:i], suffix[i] = AND of active[i + 1:]
+        prefix, running = [], base
+        for bits in active:
+            prefix.append(running)
+            running = running & bits
+        suffix, running = [None] * len(active), self._all
+        for i in range(len(active) - 1, -1, -1):
+            suffix[i] = running
+            running = running & active[i]
+
+        counts = {}
+        for i, col in enumerate(columns):
+            others = prefix[i] & suffix[i]
+            counts[col] = {
+                value: int(POPCOUNT[others & bits].sum())
+                for value, bits in self.bitmaps[col].items()
+            }
+        return counts
@@ -0,0 +1,93 @@
+import json
+
+import pandas as pd
+
+# -------------------------------------
+# Best Sellers product grid
+# -------------------------------------
+# The whole page of cards is built column-wise with pandas string ops and sent as one
+# HTML block (one Streamlit delta) instead of one st.markdown per card inside nested
+# st.columns. Images are lazy-loaded so long pages only fetch what scrolls into view.
+# "More like this" lists are plain <details> blocks, so opening one costs no rerun.
+
+GRID_CSS = """
+<style>
+.product-grid {display:grid; grid-template-columns:repeat(4, minmax(0, 1fr)); gap:30px 16px;}
+.product-card {border:1px solid #ddd; padding:20px; border-radius:10px;
+               box-shadow:0 2px 10px rgba(0,0,0,0.05); min-height:540px;
+               background-color:white; display:flex; flex-direction:column;
+               justify-content:space-between; width:100%; box-sizing:border-box;}
+.product-card img {height:240px; max-width:100%; object-fit:contain; margin:auto; margin-bottom:15px; display:block;}
+.product-name {font-weight:600; font-size:1rem; margin-bottom:10px; display:-webkit-box;
+               -webkit-line-clamp:2; -webkit-box-orient:vertical; overflow:hidden;
+               text-align:center; height:3em;}
+.product-details {font-size:0.95rem; line-height:1.6; text-align:left;}
+.similar {font-size:0.85rem; margin-top:10px;}
+.similar summary {cursor:pointer; font-weight:600;}
+.similar a {display:block; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;}
+</style>
+"""
+
+
+def escape(values: pd.Series) -> pd.Series:
+    text = values.astype(object).where(values.notna(), "").astype(str)
+    return (
+        text.str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+        .str.replace('"', "&quot;", regex=False)
+        .str.replace("'", "&#x27;", regex=False)
+    )
+
+
+def card_fields(df: pd.DataFrame) -> pd.DataFrame:
+    ratings = pd.to_numeric(df["Ratings"], errors="coerce").round(1)
+    discount = df["Discount"]
+    discount_text = escape(discount).mask(discount.astype(str).isin(["0", "0.0"]), "No").mask(discount.isna(), "N/A")
+    return pd.DataFrame({
+        "url": escape(df["URL"]),
+        "image": escape(df["ImageURL"]),
+        "name": escape(df["Product Name"]),
+        "brand": escape(df["Brand"]),
+        "model": escape(df["Model Number"]),
+        "price": pd.to_numeric(df["Price"], errors="coerce").fillna(0).astype(int).astype(str),
+        "rating": ratings.astype(str).where(ratings.notna(), "N/A"),
+        "discount": discount_text,
+    }, index=df.index)
+
+
+def rank_list(value):
+    # "Similar Ranks" is a list (Postgres array) or JSON text (Arrow snapshot)
+    if isinstance(value, str):
+        value = json.loads(value)
+    return [] if value is None else [int(rank) for rank in value]
+
+
+def similar_links(df: pd.DataFrame, similar: pd.DataFrame) -> pd.Series:
+    """One <details> block per card listing its neighbours; `similar` is indexed by Rank."""
+    f = card_fields(similar)
+    links = (
+        '<a href="' + f["url"] + '" target="_blank">' + f["brand"] + " " + f["model"]
+        + " · ₹" + f["price"] + "</a>"
+    ).to_dict()
+    items = df["Similar Ranks"].map(lambda ranks: "".join(links[r] for r in rank_list(ranks) if r in links))
+    return ('<details class="similar"><summary>More like this</summary>' + items + "</details>").where(items != "", "")
+
+
+def render_grid_html(df: pd.DataFrame, similar: pd.DataFrame = None) -> str:
+    f = card_fields(df)
+    more = similar_links(df, similar) if similar is not None and "Similar Ranks" in df.columns else ""
+    cards = (
+        '<div class="product-card"><div style="text-align:center">'
+        + '<a href="' + f["url"] + '" target="_blank">'
+        + '<img src="' + f["image"] + '" loading="lazy" decoding="async" /></a></div>'
+        + '<div class="product-name">' + f["name"] + "</div>"
+        + '<div class="product-details">'
+        + "<b>Brand:</b> " + f["brand"] + "<br>"
+        + "<b>Model:</b> " + f["model"] + "<br>"
+        + "<b>Price:</b> ₹" + f["price"] + "<br>"
+        + "<b>Rating:</b> " + f["rating"] + "/5<br>"
+        + "<b>Discount:</b> " + f["discount"]
+        + "</div>" + more + "</div>"
+    )
+    return GRID_CSS + '<div class="product-grid">' + "".join(cards) + "</div>"
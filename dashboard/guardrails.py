@@ -0,0 +1,164 @@
+import json
+import re
+
+import pandas as pd
+from sqlalchemy import text
+
+from dashboard.result_cache import normalize_sql, sql_tokens
+
+# -------------------------------------
+# Guarded execution of generated SQL
+# -------------------------------------
+# LLM-written SQL runs on the shared Supabase instance, so before it executes it must be
+# a single read-only SELECT; the planner's cost estimate (EXPLAIN) must be under a limit;
+# it runs in a READ ONLY transaction with a local statement_timeout; and the result is
+# capped by wrapping the query in an outer LIMIT. Rows come back in chunks through a
+# server-side cursor so the page can render the first rows before the rest arrive.
+# The checks lex the SQL like Postgres (E'' escapes, $tag$ quoting), reject any ";"
+# outside a literal and any unterminated quote; the page also runs everything on a
+# read-only engine (dashboard.db.get_query_engine), so a lexer gap still cannot write.
+#
+#   python -m dashboard.guardrails check   # offline regression cases for check_sql
+
+MAX_COST = 500_000
+TIMEOUT_MS = 10_000
+MAX_ROWS = 5_000
+CHUNK_SIZE = 500
+
+FORBIDDEN = {
+    "insert", "update", "delete", "merge", "upsert", "drop", "alter", "create", "truncate",
+    "grant", "revoke", "comment", "copy", "call", "do", "execute", "prepare", "vacuum",
+    "analyze", "cluster", "reindex", "lock", "set", "reset", "listen", "notify", "into",
+    "refresh", "security", "begin", "commit", "rollback", "savepoint",
+}
+FORBIDDEN_FUNCTIONS = re.compile(r"^(pg_sleep|pg_terminate_backend|pg_cancel_backend|pg_read_file|pg_ls_dir|lo_\w+|dblink\w*|set_config)$")
+
+
+class GuardrailError(Exception):
+    pass
+
+
+def sql_words(statement):
+    """Lower-cased keywords and identifiers outside literals; raises GuardrailError on a second statement."""
+    words = []
+    for kind, token in sql_tokens(statement):
+        if kind == "error":
+            raise GuardrailError("Unterminated quoted string, identifier or comment.")
+        if kind != "word":
+            continue
+        if ";" in token:
+            raise GuardrailError("Only a single statement is allowed.")
+        words += re.findall(r"[a-z_][a-z0-9_$]*", token.lower())
+    return words
+
+
+def check_sql(sql):
+    """Returns the normalized statement if it is a single read-only query; raises GuardrailError otherwise."""
+    statement = normalize_sql(sql)
+    if not statement:
+        raise GuardrailError("Empty query.")
+
+    words = sql_words(statement)
+    if not words or words[0] not in ("select", "with"):
+        raise GuardrailError("Only SELECT queries are allowed.")
+    blocked = sorted({word for word in words if word in FORBIDDEN or FORBIDDEN_FUNCTIONS.match(word)})
+    if blocked:
+        raise GuardrailError(f"Query uses a blocked keyword or function: {', '.join(blocked)}.")
+    if re.search(r"\bfor\s+(update|share|no\s+key\s+update|key\s+share)\b", statement.lower()):
+        raise GuardrailError("Row locking (FOR UPDATE/SHARE) is not allowed.")
+    return statement
+
+
+def limit_sql(statement, max_rows=MAX_ROWS):
+    # One extra row tells the caller the result was cut off
+    return f"SELECT * FROM (\n{statement}\n) AS guarded_result LIMIT {int(max_rows) + 1}"
+
+
+def _execute(conn, sql, params):
+    # Bound parameters go through text(); raw LLM SQL is sent as is (no ":name" parsing)
+    return conn.execute(text(sql), params) if params else conn.exec_driver_sql(sql)
+
+
+def explain_cost(conn, statement, params=None):
+    plan = _execute(conn, f"EXPLAIN (FORMAT JSON) {statement}", params).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def stream_guarded(engine, sql, params=None, max_cost=MAX_COST, timeout_ms=TIMEOUT_MS, max_rows=MAX_ROWS, chunk_size=CHUNK_SIZE):
+    """
+    Runs `sql` read-only under the guardrails and yields DataFrame chunks read through a
+    server-side cursor, at most max_rows + 1 rows in total (a result longer than max_rows
+    was truncated). Raises GuardrailError when rejected.
+    """
+    statement = check_sql(sql)
+    with engine.connect() as conn, conn.begin():
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        # Plain '...' strings must not take backslash escapes, or they would lex differently from check_sql
+        conn.exec_driver_sql("SET LOCAL standard_conforming_strings = on")
+
+        cost = explain_cost(conn, statement, params)
+        if cost > max_cost:
+            raise GuardrailError(
+                f"Query plan is too expensive to run on the shared database (estimated cost {cost:,.0f} > {max_cost:,.0f})."
+            )
+
+        result = _execute(conn.execution_options(stream_results=True, max_row_buffer=chunk_size), limit_sql(statement, max_rows), params)
+        columns, sent = list(result.keys()), False
+        while rows := result.fetchmany(chunk_size):
+            sent = True
+            # coerce_float: NUMERIC/SUM/AVG Decimals become floats, as pd.read_sql_query did
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        if not sent:
+            yield pd.DataFrame(columns=columns)
+
+
+def collect(chunks) -> pd.DataFrame:
+    frames = list(chunks)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def run_guarded(engine, sql, params=None, **limits) -> pd.DataFrame:
+    """stream_guarded() collected into one DataFrame."""
+    return collect(stream_guarded(engine, sql, params, **limits))
+
+
+# Regression cases: each must be rejected by check_sql
+REJECTED = [
+    # E'' escape string hiding a second statement (the closing quote is escaped)
+    "SELECT E'\\'' ; COMMIT; DELETE FROM \"All - Product Count_output\"; -- '",
+    "SELECT 1, e'\\'' ; COMMIT; DROP TABLE \"All - Product Count_output\"; -- '",
+    # "--" comments end at \r as well as \n
+    "SELECT 1 -- note\r; COMMIT; DELETE FROM \"Best Rank_All_output\"",
+    # statements after a dollar-quoted body
+    "SELECT $q$ ' $q$ ; COMMIT; DELETE FROM \"Best Rank_All_output\"; -- '",
+    # unterminated literals
+    "SELECT 'abc",
+    "SELECT $$abc",
+    'SELECT "abc',
+    "SELECT 1; DELETE FROM t",
+    "DELETE FROM t",
+    "SELECT pg_sleep(60)",
+]
+ACCEPTED = [
+    "SELECT E'it\\'s', 'a;b', $$c;d$$, $t$e;f$t$ FROM \"All - Product Count_output\";",
+    "SELECT brand FROM \"All - Product Count_output\" -- trailing; comment",
+    "SELECT \"Specs\" @> '{\"Crystal Material\": \"Sapphire\"}' FROM \"Final_Watch_Dataset_Men_output\"",
+]
+
+
+def check():
+    for sql in REJECTED:
+        try:
+            check_sql(sql)
+        except GuardrailError:
+            continue
+        raise AssertionError(f"accepted: {sql!r}")
+    for sql in ACCEPTED:
+        check_sql(sql)
+    print(f"✅ Guardrails: {len(REJECTED)} rejected, {len(ACCEPTED)} accepted as expected")
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,229 @@
+import re
+from dataclasses import dataclass
+
+from segments import PRICE_LABELS
+
+# -------------------------------------
+# Deterministic intent router
+# -------------------------------------
+# The bulk of Ask Questions traffic is "top brands by product/SKU count", "counts per
+# price band", "best rank" and "Top 1000" questions, which the table_guidance rules
+# already map to fixed tables. route_question() recognizes those patterns (metric,
+# gender, price bands, brands, top-N, scope) and emits parameterized SQL against the
+# *_output tables; anything it is not sure about returns None and goes to Gemini. That
+# includes any number or word left over once the recognized parts are taken out
+# ("with more than 50 products", "in 2024", "on Flipkart"), since dropping it would
+# answer a different question.
+
+# Price band label -> (low, high) in thousands of rupees
+BAND_BOUNDS = dict(zip(PRICE_LABELS, [(0, 10), (10, 15), (15, 25), (25, 40), (40, float("inf"))]))
+
+NUMBER_WORDS = {"three": 3, "five": 5, "ten": 10, "fifteen": 15, "twenty": 20, "fifty": 50}
+
+# Anything the templates cannot express goes to the LLM
+UNSUPPORTED = re.compile(
+    r"\b(average|avg|mean|median|discount|rating|review|cheapest|expensive|costliest|dial|case|strap|"
+    r"material|colou?r|movement|spec|feature|model|diameter|water|listing url|asin|percent|share|ratio|"
+    r"growth|trend|least|lowest|bottom|fewest|worst|not|without|except|excluding)"
+)
+# Price ranges parse_bands() understands (thousands of rupees)
+RANGE_PATTERN = re.compile(r"(\d+)k?\s*(?:-|to|and)\s*(\d+)k\b")
+UNDER_PATTERN = re.compile(r"(?:under|below|less than|<|up ?to)\s*(\d+)k\b")
+OVER_PATTERN = re.compile(r"(?:above|over|more than|>)\s*(\d+)k\b|\b(\d+)k\s*\+")
+TOP_PATTERN = re.compile(r"\btop[- ](\d+|" + "|".join(NUMBER_WORDS) + r")\b")
+# "Amazon ranking" means the Top 1000 tables (table_guidance rule 3)
+RANKING_PATTERN = re.compile(r"\b(amazon )?(ranking|rankings|bestseller list)\b")
+# Words the templates fully account for; anything else sends the question to the LLM
+KNOWN_WORDS = set("""
+show me list give get find tell display what which who whose are is the a an of for by in on at with and to per
+each across all their its have has having how many do does please wise based most highest high top largest biggest
+dominant leading popular brand brands product products listing listings count counts number sku skus watch watches
+item items total price prices priced band bands range ranges bucket buckets segment segments distribution split
+breakdown men mens man male gents women womens woman female ladies best rank ranks first appearance amazon
+""".split())
+RANK_PATTERN = re.compile(r"\b(best rank|first appearance|highest rank|top rank|best[- ]ranked|ranks?)\b")
+SKU_PATTERN = re.compile(r"\bskus?\b")
+PRODUCT_PATTERN = re.compile(r"\b(products?|listings?|count|number of (watches|items)|dominant|leading|biggest|top(?:[- ]\w+)? brands?)\b")
+EXPLICIT_PRODUCT_PATTERN = re.compile(r"\b(products?|listings?)\b")
+BREAKDOWN_PATTERN = re.compile(r"\b(price (bands?|ranges?|buckets?|segments?)|bands|buckets|distribution|across|split|breakdown)\b")
+MEN_PATTERN = re.compile(r"\b(men|mens|man|male|gents)\b")
+WOMEN_PATTERN = re.compile(r"\b(women|womens|woman|female|ladies)\b")
+
+
+@dataclass(frozen=True)
+class RoutedQuery:
+    intent: str
+    sql: str
+    params: dict
+    chart: str = "bar"
+
+
+def quote(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+def normalize(question):
+    text = question.lower().replace("’", "'").replace("'s", "s")
+    text = re.sub(r"[–—−]", "-", text)
+    text = re.sub(r"\b(?:rs\.?|inr)\s*(?=\d)|₹\s*", "", text)
+    text = re.sub(r"(\d+),(\d{3})\b", r"\1\2", text)
+    text = re.sub(r"\b(\d+)000\b", r"\1k", text)
+    text = re.sub(r"\btop[- ]1k\b", "top 1000", text)  # "top 1000" survives the k rewrite
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def parse_bands(text):
+    """Price bands named in the question, [] if none, None if a range does not line up with the bands."""
+    ranges = []
+    for low, high in RANGE_PATTERN.findall(text):
+        ranges.append((int(low), int(high)))
+    for high in UNDER_PATTERN.findall(text):
+        ranges.append((0, int(high)))
+    for over, plus in OVER_PATTERN.findall(text):
+        ranges.append((int(over or plus), float("inf")))
+
+    bands = []
+    for low, high in ranges:
+        inside = [label for label, (lo, hi) in BAND_BOUNDS.items() if lo >= low and hi <= high]
+        covered = (min(BAND_BOUNDS[b][0] for b in inside), max(BAND_BOUNDS[b][1] for b in inside)) if inside else None
+        if covered != (low, high):
+            return None
+        bands += [band for band in inside if band not in bands]
+    return [band for band in PRICE_LABELS if band in bands]
+
+
+def parse_limit(text):
+    """(top-N limit or None, scope) where scope is "top1000", "top100" or "all"."""
+    limit, scope = None, "top1000" if RANKING_PATTERN.search(text) else "all"
+    for value in TOP_PATTERN.findall(text):
+        n = NUMBER_WORDS.get(value) or int(value)
+        if n == 1000:
+            scope = "top1000"
+        elif n == 100:
+            scope = "top100"
+        else:
+            limit = n
+    return limit, scope
+
+
+def find_brands(text, brands):
+    found = []
+    for brand in sorted(brands, key=len, reverse=True):  # "titan edge" before "titan"
+        name = str(brand).lower()
+        if name != "others" and re.search(rf"(?<![\w]){re.escape(name)}(?![\w])", text):
+            found.append(brand)
+            text = text.replace(name, " ")
+    return found
+
+
+def leftover(text, brands):
+    """Words and numbers of `text` not accounted for by a template (brands, price ranges, top-N, KNOWN_WORDS)."""
+    for brand in brands:
+        text = re.sub(rf"(?<![\w]){re.escape(str(brand).lower())}(?![\w])", " ", text)
+    for pattern in (RANGE_PATTERN, UNDER_PATTERN, OVER_PATTERN, TOP_PATTERN, RANKING_PATTERN, RANK_PATTERN):
+        text = pattern.sub(" ", text)
+    return [word for word in re.findall(r"\w+", text) if word not in KNOWN_WORDS]
+
+
+def build_query(table, value_cols, order_col, brands, limit, ascending=False, total=None):
+    select = ["brand", *(quote(col) for col in value_cols)]
+    if total:
+        select.append(" + ".join(quote(col) for col in total) + ' AS "Total"')
+    params = {f"brand_{i}": brand for i, brand in enumerate(brands)}
+    where = (
+        "brand IN (" + ", ".join(f":{name}" for name in params) + ")" if brands
+        else "brand <> 'Others'"  # rule 10
+    )
+    sql = (
+        f"SELECT {', '.join(select)} FROM {quote(table)} WHERE {where} "
+        f"ORDER BY {order_col} {'ASC' if ascending else 'DESC'}"
+    )
+    if limit:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return sql, params
+
+
+def route_question(question, brands=(), table_columns=None):
+    """
+    RoutedQuery for questions the templates answer exactly, else None. `brands` are the
+    known brand names; `table_columns` ({table: columns}, optional) lets templates that
+    need a missing column fall back to the LLM instead of failing.
+    """
+    text = normalize(question)
+    if UNSUPPORTED.search(text):
+        return None
+
+    named_brands = find_brands(text, brands)
+    if "brand" not in text and not named_brands:
+        return None
+    if leftover(text, named_brands):
+        return None
+
+    # "SKU count" is an SKU question; "products and SKUs" or "SKU rank" is two metrics
+    is_sku = bool(SKU_PATTERN.search(text))
+    is_rank = bool(RANK_PATTERN.search(text))
+    if (is_sku and (is_rank or EXPLICIT_PRODUCT_PATTERN.search(text))) or (is_rank and EXPLICIT_PRODUCT_PATTERN.search(text)):
+        return None
+    if not (is_sku or is_rank or PRODUCT_PATTERN.search(text)):
+        return None
+
+    men, women = bool(MEN_PATTERN.search(text)), bool(WOMEN_PATTERN.search(text))
+    if men and women:
+        return None
+    gender = "Men" if men else "Women" if women else None
+
+    bands = parse_bands(text)
+    if bands is None:
+        return None
+    limit, scope = parse_limit(text)
+    breakdown = bool(BREAKDOWN_PATTERN.search(text))
+    metric = "SKU" if is_sku else "Product"
+    total = None
+
+    if is_rank:
+        if gender or bands or breakdown or scope != "all":
+            return None
+        table, cols = "Best Rank_All_output", ["Best Rank (First Appearance)"]
+        sql, params = build_query(table, cols, quote(cols[0]), named_brands, limit, ascending=True)
+        intent = "best rank by brand"
+
+    elif scope == "top1000":
+        if bands or breakdown:
+            return None
+        if gender:
+            table, col = f"{gender} - {metric} Count_output", f"{gender} - {metric} Count (Top 1000)"
+        else:
+            table, col = f"Top 1000 - {metric} Count_output", f"Top 1000 {metric} Count"
+        cols = [col]
+        sql, params = build_query(table, cols, quote(col), named_brands, limit)
+        intent = f"Top 1000 {metric.lower()} count by brand" + (f" ({gender.lower()})" if gender else "")
+
+    elif gender:
+        # Gender splits across price bands only exist for the Top 100 lists (rule 4)
+        if is_sku or not (bands or breakdown or scope == "top100"):
+            return None
+        table = f"{gender.lower()}_price_range_top100_output"
+        if bands:
+            cols, total = bands, bands if len(bands) > 1 else None
+        else:
+            cols, total = PRICE_LABELS + ["total"], None
+        order = '"Total"' if total else quote(cols[-1] if not bands else cols[0])
+        sql, params = build_query(table, cols, order, named_brands, limit, total=total)
+        intent = f"{gender.lower()} Top 100 products per price band"
+
+    else:
+        if scope == "top100":
+            return None
+        table = f"All - {metric} Count_output"
+        cols = bands if bands else (PRICE_LABELS if breakdown else [])
+        total = (bands or PRICE_LABELS) if len(bands) != 1 else None
+        order = '"Total"' if total else quote(bands[0])
+        sql, params = build_query(table, cols, order, named_brands, limit, total=total)
+        intent = f"{metric.lower()} count by brand" + (f" in {', '.join(bands)}" if bands else "")
+
+    if table_columns is not None:
+        needed = set(cols) | set(total or [])
+        if table not in table_columns or not needed <= set(table_columns[table]):
+            return None
+    return RoutedQuery(intent=intent, sql=sql, params=params)
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# -------------------------------------
+# Shared LLM request broker
+# -------------------------------------
+# Every Gemini call from every session goes through one process-wide broker: a bounded
+# worker pool, a token bucket for the provider's rate limit, a per-attempt timeout with
+# retries, and coalescing of identical prompts already in flight (one call, every waiter
+# gets its result). The model is asked for SQL and chart type together as one JSON
+# object, so a question costs a single round trip.
+#
+# Calls run on the llm-job workers themselves, so max_concurrency bounds live provider
+# calls. The per-attempt timeout is passed to the client as a request deadline, which
+# ends a stalled call and frees its worker for the retry.
+#
+#   python -m dashboard.llm check   # parse + broker checks against StubModel, no network
+
+CHART_TYPES = ["bar", "pie", "line", "scatter", "none"]
+
+ANSWER_FORMAT = """
+Respond with one JSON object and nothing else:
+{"sql": "<the PostgreSQL query, or INVALID_QUERY if no table fits>", "chart": "<one of: bar, pie, line, scatter, none>"}
+"chart" is the chart type that best visualizes the query result.
+"""
+
+TIMEOUT_S = 20
+RETRIES = 2
+BACKOFF_S = 1.0
+MAX_CONCURRENCY = 4
+RATE_PER_MINUTE = 30
+BURST = 5
+
+
+class LLMError(Exception):
+    pass
+
+
+def strip_fences(text):
+    return re.sub(r"^```[a-z]*\s*|\s*```$", "", text.strip()).strip()
+
+
+def parse_answer(text):
+    """(sql, chart) from the model's reply; a bare SQL reply (no "{") is accepted with chart "none"."""
+    body = strip_fences(text)
+    if "{" not in body:
+        return body, "none"
+    try:
+        answer = json.loads(body[body.index("{"):body.rindex("}") + 1])
+        sql, chart = strip_fences(str(answer.get("sql", ""))), str(answer.get("chart", "none")).strip().lower()
+    except (ValueError, AttributeError):
+        raise LLMError(f"Model reply is not valid JSON: {body[:200]}")
+    if not sql:
+        raise LLMError("Model reply has no SQL.")
+    return sql, chart if chart in CHART_TYPES else "none"
+
+
+class TokenBucket:
+    """Allows `rate_per_s` acquisitions per second on average, `burst` at once."""
+
+    def __init__(self, rate_per_s, burst):
+        self.rate_per_s = rate_per_s
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_s)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate_per_s
+            time.sleep(delay)
+            waited += delay
+
+
+def then(future, fn):
+    """Future of fn(future.result()); exceptions pass through."""
+    chained = Future()
+
+    def done(source):
+        try:
+            chained.set_result(fn(source.result()))
+        except Exception as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(done)
+    return chained
+
+
+class LLMBroker:
+    def __init__(self, model, max_concurrency=MAX_CONCURRENCY, rate_per_minute=RATE_PER_MINUTE, burst=BURST,
+                 timeout_s=TIMEOUT_S, retries=RETRIES, backoff_s=BACKOFF_S):
+        self.model = model
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+        # One worker per live call: bounds concurrent calls to the provider
+        self._jobs = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-job")
+        self._lock = threading.Lock()
+        self._inflight = {}  # prompt hash -> Future
+        self.counts = {"requests": 0, "coalesced": 0, "calls": 0, "retries": 0, "failures": 0, "queued": 0, "running": 0}
+        self.rate_limited_s = 0.0
+
+    def _bump(self, name, by=1):
+        with self._lock:
+            self.counts[name] += by
+
+    def _generate(self, prompt):
+        # The client enforces the deadline (DeadlineExceeded), so a stalled call ends on this worker
+        return self.model.generate_content(prompt, request_options={"timeout": self.timeout_s}).text
+
+    def _with_retries(self, prompt):
+        self._bump("queued", -1)
+        self._bump("running")
+        try:
+            last_error = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._bump("retries")
+                    time.sleep(self.backoff_s * 2 ** (attempt - 1))
+                waited = self.bucket.acquire()
+                with self._lock:
+                    self.rate_limited_s += waited
+                    self.counts["calls"] += 1
+                try:
+                    return self._generate(prompt)
+                except Exception as e:
+                    last_error = str(e)
+            self._bump("failures")
+            raise LLMError(f"{last_error} ({self.retries + 1} attempts)")
+        finally:
+            self._bump("running", -1)
+
+    def submit(self, prompt):
+        """Future resolving to the raw reply text (raises LLMError). Identical in-flight prompts share one call."""
+        key = hashlib.sha256(prompt.encode()).hexdigest()
+        with self._lock:
+            self.counts["requests"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counts["coalesced"] += 1
+                return future
+            self.counts["queued"] += 1
+            future = self._jobs.submit(self._with_retries, prompt)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def submit_answer(self, prompt):
+        """Future resolving to (sql, chart) for a prompt that ends with ANSWER_FORMAT."""
+        return then(self.submit(prompt), parse_answer)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                **self.counts,
+                "in_flight": len(self._inflight),
+                "rate_limited_s": round(self.rate_limited_s, 1),
+                "tokens_available": round(self.bucket.tokens, 2),
+            }
+
+
+class StubModel:
+    """
+    Offline stand-in for genai.GenerativeModel (LLM_MODEL = "stub" in secrets): answers
+    every prompt with a canned reply after `delay_s`, so the page, timeouts and retries
+    can be exercised without network access. Like the real client, a request timeout
+    shorter than `delay_s` ends the call with an error.
+    """
+
+    class Reply:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self, reply=None, delay_s=0.2, failures=0):
+        self.reply = reply or json.dumps({"sql": 'SELECT * FROM "All - Product Count_output" LIMIT 10', "chart": "bar"})
+        self.delay_s = delay_s
+        self.failures = failures  # first N calls raise, to exercise retries
+        self.calls = 0
+        self.live = self.peak_live = 0  # concurrent calls, to check the broker's bound
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, request_options=None):
+        with self._lock:
+            self.calls += 1
+            self.live += 1
+            self.peak_live = max(self.peak_live, self.live)
+            fail = self.calls <= self.failures
+        try:
+            timeout = (request_options or {}).get("timeout")
+            if timeout is not None and self.delay_s > timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"stub model deadline of {timeout}s exceeded")
+            time.sleep(self.delay_s)
+            if fail:
+                raise RuntimeError("stub model failure")
+            return self.Reply(self.reply)
+        finally:
+            with self._lock:
+                self.live -= 1
+
+
+def check():
+    """Offline checks of the answer parser and the broker, using StubModel."""
+    reply = json.dumps({"sql": "SELECT 1", "chart": "pie"})
+    assert parse_answer(f"```json\n{reply}\n```") == ("SELECT 1", "pie")
+    assert parse_answer("SELECT 2") == ("SELECT 2", "none")
+    assert parse_answer('{"sql": "SELECT 3", "chart": "radar"}') == ("SELECT 3", "none")
+    for bad in ['{"sql": "SELECT 4", "chart": ', '{"chart": "bar"}']:
+        try:
+            parse_answer(bad)
+        except LLMError:
+            pass
+        else:
+            raise AssertionError(f"accepted malformed reply {bad!r}")
+
+    # One combined call; identical prompts in flight share it
+    model = StubModel(reply, delay_s=0.2)
+    broker = LLMBroker(model, rate_per_minute=600)
+    first, second = broker.submit_answer("q"), broker.submit_answer("q")
+    assert first.result() == second.result() == ("SELECT 1", "pie")
+    assert model.calls == 1 and broker.metrics()["coalesced"] == 1, broker.metrics()
+
+    # Failures are retried
+    model = StubModel(reply, delay_s=0.01, failures=1)
+    broker = LLMBroker(model, rate_per_minute=600, backoff_s=0.01)
+    assert broker.submit_answer("q").result() == ("SELECT 1", "pie") and model.calls == 2
+
+    # A stalled provider: each attempt ends at the deadline and is retried, and live calls
+    # never exceed max_concurrency however many questions are waiting
+    model = StubModel(reply, delay_s=5)
+    broker = LLMBroker(model, max_concurrency=2, rate_per_minute=6000, burst=20, timeout_s=0.2, retries=1, backoff_s=0.01)
+    start = time.monotonic()
+    futures = [broker.submit_answer(f"q{i}") for i in range(6)]
+    for future in futures:
+        try:
+            future.result()
+        except LLMError:
+            continue
+        raise AssertionError("stalled call did not fail")
+    elapsed = time.monotonic() - start
+    assert model.calls == 12 and model.peak_live <= 2 and elapsed < 3, (model.calls, model.peak_live, elapsed)
+    print("✅ LLM broker: parsing, coalescing, retries and timeouts OK")
+
+
+if __name__ == "__main__":
+    check()
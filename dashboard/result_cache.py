@@ -0,0 +1,137 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# -------------------------------------
+# Query result cache
+# -------------------------------------
+# Results of Ask Questions queries keyed on (normalized SQL, bind parameters, dataset
+# version). Entries are kept as compressed Arrow IPC buffers in one process-wide LRU
+# bounded by total bytes, so repeated questions and follow-up clicks from any session
+# are served from memory until the pipeline publishes a new version.
+
+MAX_BYTES = 64 * 1024 * 1024
+MAX_ENTRY_FRACTION = 0.25  # a single result may use at most this share of the cache
+
+# Lexed the way Postgres does: E'' strings take backslash escapes, $tag$ bodies are
+# literal, "--" comments end at \n or \r. Anything else that starts a quote or comment
+# but never closes it is reported as an "error" token.
+SQL_TOKEN = re.compile(r"""
+    (?P<string>(?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')
+  | (?P<ident>"(?:[^"]|"")*")
+  | (?P<dollar>(?<![\w$])\$(?P<tag>(?:[A-Za-z_][A-Za-z0-9_]*)?)\$.*?\$(?P=tag)\$)
+  | (?P<comment>--[^\n\r]*|/\*.*?\*/)
+  | (?P<error>(?<![\w$])\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$|/\*)
+  | (?P<space>\s+)
+  | (?P<word>\w+|[^'"\s\w$/-]+|[$/-])
+""", re.S | re.X)
+
+
+def sql_tokens(sql):
+    """(kind, text) pairs covering all of `sql`; kind is a SQL_TOKEN group name or "error"."""
+    pos = 0
+    for match in SQL_TOKEN.finditer(sql):
+        if match.start() > pos:
+            yield "error", sql[pos:match.start()]
+        yield match.lastgroup, match.group()
+        pos = match.end()
+    if pos < len(sql):
+        yield "error", sql[pos:]
+
+
+def normalize_sql(sql):
+    """Collapses whitespace and drops comments and trailing semicolons; quoted text is kept as is."""
+    parts = []
+    for kind, token in sql_tokens(sql):
+        if kind in ("space", "comment"):
+            token = " "
+        if token != " " or (parts and parts[-1] != " "):
+            parts.append(token)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def cache_key(sql, params, version):
+    payload = f"{version}\n{normalize_sql(sql)}\n{sorted((params or {}).items())!r}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def to_ipc(df: pd.DataFrame) -> bytes:
+    # pyarrow is imported on first store, not when the page (or guardrails) loads
+    import pyarrow as pa
+    from dashboard.snapshots import to_arrow
+
+    table = to_arrow(df)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="lz4" if pa.Codec.is_available("lz4") else None)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def from_ipc(data: bytes) -> pd.DataFrame:
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+class ResultCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> IPC bytes, least recently used first
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.skipped = 0
+
+    def get(self, sql, params=None, version=0):
+        key = cache_key(sql, params, version)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return from_ipc(data)
+
+    def put(self, sql, params, version, df: pd.DataFrame):
+        data = to_ipc(df)
+        if len(data) > self.max_bytes * MAX_ENTRY_FRACTION:
+            with self._lock:
+                self.skipped += 1
+            return
+        key = cache_key(sql, params, version)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_or_run(self, sql, params, version, run):
+        """(DataFrame, served_from_cache); `run()` executes the query on a miss."""
+        df = self.get(sql, params, version)
+        if df is not None:
+            return df, True
+        df = run()
+        self.put(sql, params, version, df)
+        return df, False
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "skipped_oversized": self.skipped,
+            }
@@ -0,0 +1,114 @@
+import math
+import re
+from collections import Counter
+
+from sqlalchemy import inspect
+
+# -------------------------------------
+# Schema prompt for generate_sql
+# -------------------------------------
+# Table columns are read from the database (cached per dataset version by the page)
+# instead of a hand-maintained list, and each prompt only carries the tables that score
+# as relevant to the question. Scores are idf-weighted overlaps between the question and
+# each table's name, columns and topic words taken from the table_guidance rules.
+
+# Tables Ask Questions may query -> topic words (from the routing rules)
+ASK_TABLES = {
+    "product_price_cleaned_output": "listing price discount product url asin code general compare cheap costly expensive",
+    "All - Product Count_output": "product count dominant leading top brand price band bucket range total",
+    "All - SKU Count_output": "sku count price band bucket range total",
+    "Top 1000 - Product Count_output": "top 1000 amazon ranking product count",
+    "Top 1000 - SKU Count_output": "top 1000 amazon ranking sku count",
+    "Men - Product Count_output": "top 1000 men product count",
+    "Men - SKU Count_output": "top 1000 men sku count",
+    "Women - Product Count_output": "top 1000 women product count",
+    "Women - SKU Count_output": "top 1000 women sku count",
+    "Best Rank_All_output": "best rank first appearance position",
+    "men_price_range_top100_output": "men top 100 bestseller price range band distribution",
+    "women_price_range_top100_output": "women top 100 bestseller price range band distribution",
+    "Final_Watch_Dataset_Men_output": "men top 100 bestseller watch spec detail dial case strap material colour color "
+                                      "movement diameter thickness crystal water resistance rating feature model",
+    "Final_Watch_Dataset_Women_output": "women top 100 bestseller watch spec detail dial case strap material colour color "
+                                        "movement diameter thickness crystal water resistance rating feature model",
+}
+# Internal columns the model should not see
+HIDDEN_COLUMNS = {"Search Text", "Similar Ranks"}
+
+MAX_TABLES = 4
+RELATIVE_CUTOFF = 0.5  # keep tables scoring at least half the best score
+
+
+def introspect_schemas(engine, tables=ASK_TABLES) -> dict:
+    """{table: [columns]} as they exist in the database; missing tables are left out."""
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    return {
+        table: [col["name"] for col in inspector.get_columns(table) if col["name"] not in HIDDEN_COLUMNS]
+        for table in tables if table in existing
+    }
+
+
+def terms(text):
+    words = re.findall(r"[a-z0-9]+", str(text).lower().replace("top100", "top 100"))
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words}
+
+
+def comparative_roots(word):
+    """Possible base forms of a -er/-est word: cheapest -> cheap, biggest -> big, costliest -> costly."""
+    for suffix in ("est", "er"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            roots = {stem, stem[:-1] + "y" if stem.endswith("i") else stem}
+            if len(stem) > 2 and stem[-1] == stem[-2]:
+                roots.add(stem[:-1])
+            return roots
+    return set()
+
+
+def table_profiles(schemas):
+    return {
+        table: terms(table.replace("_", " ")) | terms(" ".join(cols)) | terms(ASK_TABLES.get(table, ""))
+        for table, cols in schemas.items()
+    }
+
+
+def relevant_tables(question, schemas, max_tables=MAX_TABLES):
+    """Tables for the prompt, best first; every table when nothing in the question scores."""
+    profiles = table_profiles(schemas)
+    doc_freq = Counter(term for profile in profiles.values() for term in profile)
+    idf = {term: math.log(1 + len(profiles) / count) for term, count in doc_freq.items()}
+
+    # Comparatives only count through a root some table already knows ("water" stays "water")
+    question_terms = terms(question)
+    question_terms |= {root for word in question_terms for root in comparative_roots(word) if root in doc_freq}
+    scores = {table: sum(idf[t] for t in question_terms & profile) for table, profile in profiles.items()}
+    best = max(scores.values(), default=0)
+    if best == 0:
+        return list(schemas)
+    ranked = sorted((table for table in scores if scores[table] >= best * RELATIVE_CUTOFF), key=lambda t: -scores[t])
+    return ranked[:max_tables]
+
+
+def schema_prompt(question, schemas):
+    tables = relevant_tables(question, schemas) if question else list(schemas)
+    return "\n".join(f"- {table}: [{', '.join(schemas[table])}]" for table in tables)
+
+
+# Regression cases: question -> table that must reach the prompt
+ROUTED = {
+    "What is the cheapest Fossil watch?": "product_price_cleaned_output",
+    "Which women's watch is the costliest?": "product_price_cleaned_output",
+    "Show the water resistance of men's watches": "Final_Watch_Dataset_Men_output",
+}
+
+
+def check():
+    schemas = {table: [] for table in ASK_TABLES}
+    for question, table in ROUTED.items():
+        picked = relevant_tables(question, schemas)
+        assert table in picked, f"{question!r} -> {picked}"
+    print(f"✅ Schema routing: {len(ROUTED)} questions keep their tables")
+
+
+if __name__ == "__main__":
+    check()
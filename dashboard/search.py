@@ -0,0 +1,110 @@
+import json
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------
+# Product search (inverted index)
+# -------------------------------------
+# Built once per dataset version from product name, model number, brand and every parsed
+# spec value. A query token matches vocabulary terms exactly, by prefix ("fs47" ->
+# "fs4795") or by trigram similarity for typos ("fosil" -> "fossil"); rows must match
+# every query token and are ranked by summed idf-weighted match quality.
+
+SEARCH_COLUMNS = ["Product Name", "Model Number", "Brand"]
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+MIN_SIMILARITY = 0.4
+MAX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def spec_values(specs):
+    # "Specs" arrives as a dict (JSONB) or JSON text (Arrow snapshot)
+    if isinstance(specs, str):
+        try:
+            specs = json.loads(specs)
+        except ValueError:
+            return specs
+    return " ".join(str(value) for value in specs.values()) if isinstance(specs, dict) else ""
+
+
+class SearchIndex:
+    def __init__(self, documents):
+        self.size = len(documents)
+        postings = defaultdict(list)
+        for row, doc in enumerate(documents):
+            for token in set(tokenize(doc)):
+                postings[token].append(row)
+
+        self.postings = {term: np.array(rows, dtype=np.int64) for term, rows in postings.items()}
+        self.idf = {term: math.log(1 + self.size / len(rows)) for term, rows in self.postings.items()}
+        self.vocabulary = sorted(self.postings)
+        self.trigram_terms = defaultdict(list)
+        for term in self.vocabulary:
+            for gram in trigrams(term):
+                self.trigram_terms[gram].append(term)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns=SEARCH_COLUMNS, specs_col="Specs"):
+        text = pd.Series("", index=df.index)
+        for col in columns:
+            if col in df.columns:
+                text = text + " " + df[col].fillna("").astype(str)
+        if specs_col in df.columns:
+            text = text + " " + df[specs_col].map(spec_values)
+        return cls(text.tolist())
+
+    def expand(self, token):
+        """Vocabulary terms a query token matches, with a match weight in (0, 1]."""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+
+        i = bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token) and len(matches) < MAX_EXPANSIONS:
+            matches.setdefault(self.vocabulary[i], PREFIX_WEIGHT)
+            i += 1
+
+        if len(token) >= 3:
+            grams = trigrams(token)
+            shared = Counter(term for gram in grams for term in self.trigram_terms.get(gram, ()))
+            for term, n_shared in shared.most_common(MAX_EXPANSIONS):
+                similarity = n_shared / (len(grams) + len(trigrams(term)) - n_shared)
+                if similarity >= MIN_SIMILARITY:
+                    matches.setdefault(term, FUZZY_WEIGHT * similarity)
+        return matches
+
+    def search(self, query, limit=None):
+        """Row positions matching every token of `query`, best first; None for an empty query."""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+
+        scores = np.zeros(self.size)
+        matched = np.ones(self.size, dtype=bool)
+        for token in tokens:
+            token_scores = np.zeros(self.size)
+            for term, weight in self.expand(token).items():
+                rows = self.postings[term]
+                token_scores[rows] = np.maximum(token_scores[rows], weight * self.idf[term])
+            matched &= token_scores > 0
+            scores += token_scores
+
+        hits = np.flatnonzero(matched)
+        ranked = hits[np.argsort(-scores[hits], kind="stable")]  # ties keep Top 100 order
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# -------------------------------------
+# Memory-mapped Arrow snapshots
+# -------------------------------------
+# Each published table is written once per dataset version as an uncompressed Arrow IPC
+# (Feather v2) file and opened memory-mapped. Every session and every process on the host
+# reads the same OS page cache instead of holding its own pickled DataFrame copy.
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", ".snapshots")
+
+
+def snapshot_path(table_name, version, root=SNAPSHOT_DIR):
+    return os.path.join(root, f"v{version}", f"{table_name}.arrow")
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        # JSONB columns (e.g. "Specs") come back as dicts; store them as JSON text
+        df[col] = df[col].map(lambda v: json.dumps(v) if isinstance(v, (dict, list)) else v).astype("string")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_snapshot(df: pd.DataFrame, path):
+    # Uncompressed so the file can be memory-mapped without decoding
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(to_arrow(df), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def open_snapshot(path) -> pa.Table:
+    return feather.read_table(path, memory_map=True)
+
+
+def prune_snapshots(keep_version, root=SNAPSHOT_DIR):
+    # Mapped files stay readable after unlink, so sessions on the old version are safe
+    for entry in os.listdir(root):
+        if entry != f"v{keep_version}":
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def ensure_snapshot(engine, table_name, version, root=SNAPSHOT_DIR) -> pa.Table:
+    path = snapshot_path(table_name, version, root)
+    if not os.path.exists(path):
+        write_snapshot(pd.read_sql_table(table_name, con=engine), path)
+        prune_snapshots(version, root)
+    return open_snapshot(path)
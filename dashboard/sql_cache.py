@@ -0,0 +1,236 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from contextlib import closing
+
+# -------------------------------------
+# Question -> SQL cache
+# -------------------------------------
+# Generated SQL (and its chart type) is stored in a local SQLite file keyed on the normalized question and the
+# prompt version (hash of schemas, routing rules and model). A new question is answered
+# from the cache when it normalizes to a stored key, or when its character n-gram TF-IDF
+# vector is close enough to a stored one and it names the same numbers, gender, metric,
+# ranking and comparison terms ("top 10 men" never reuses "top 5 women"), the same names
+# (any word outside the generic vocabulary: brands, collections, model numbers, specs)
+# and the same negations ("not from Casio" never reuses "from Casio"). No network involved.
+
+CACHE_PATH = os.environ.get("QUESTION_CACHE_PATH", os.path.join(".cache", "question_sql.sqlite"))
+
+SIMILARITY_THRESHOLD = 0.8
+NGRAM_SIZES = (3, 4, 5)
+
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "by", "to", "and", "with", "me", "show",
+    "list", "give", "get", "find", "tell", "what", "which", "who", "is", "are", "please",
+    "can", "you", "display", "all", "do", "does", "there", "how", "has", "have", "having",
+}
+# Terms that change the answer; similar questions must agree on these exactly
+GUARD_TERMS = {
+    "men": "men", "mens": "men", "man": "men", "male": "men", "gents": "men",
+    "women": "women", "womens": "women", "woman": "women", "female": "women", "ladies": "women",
+    "sku": "sku", "skus": "sku",
+    "product": "product", "products": "product",
+    "rank": "rank", "ranking": "rank", "ranked": "rank",
+    "top": "top", "best": "best", "least": "least", "lowest": "least", "bottom": "least",
+    "average": "average", "avg": "average", "mean": "average",
+    "discount": "discount", "discounts": "discount", "rating": "rating", "ratings": "rating",
+    "over": "gt", "above": "gt", "more": "gt", "greater": "gt", "exceeding": "gt", ">": "gt", "+": "gt",
+    "under": "lt", "below": "lt", "less": "lt", "fewer": "lt", "cheaper": "lt", "<": "lt",
+    "between": "between",
+}
+NEGATIONS = {"not", "no", "non", "without", "except", "excluding", "exclude", "excludes"}
+# Words that can be paraphrased without changing the SQL; every other word is a name
+GENERIC_TERMS = {
+    "watch", "watches", "brand", "brands", "price", "prices", "priced", "band", "bands", "bucket", "buckets",
+    "range", "ranges", "segment", "category", "count", "counts", "number", "many", "much", "total", "sum",
+    "most", "highest", "high", "leading", "dominant", "popular", "biggest", "largest", "per", "each", "across",
+    "every", "from", "than", "their", "its", "that", "this", "those", "these", "within", "amazon", "data",
+    "listing", "listings", "item", "items", "compare", "comparison", "versus", "vs", "distribution",
+    "breakdown", "wise", "rs", "inr", "rupee", "rupees", "k", "s", "it", "them", "they", "where", "whose",
+}
+# Skipped between a negation and the word it negates ("not from Casio" -> Casio)
+NEGATION_FILLER = {"from", "by", "made", "brand", "brands", "of", "any", "in", "including"}
+NUMBER_PATTERN = re.compile(r"^\d+(?:\.\d+)?k?$")
+
+
+def normalize_question(question):
+    text = unicodedata.normalize("NFKC", str(question)).lower()
+    text = re.sub(r"[–—−]", "-", text)
+    words = re.findall(r"[a-z0-9]+(?:\.\d+)?k?|<|>|\+", text)
+    return " ".join(stem(word) for word in words if word not in STOPWORDS)
+
+
+def stem(word):
+    # Plural-insensitive: "brands" / "brand", "products" / "product"
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def signature(normalized):
+    words = normalized.split()
+    numbers = tuple(sorted(word for word in words if NUMBER_PATTERN.match(word)))
+    guards = frozenset(filter(None, map(guard_terms, words)))
+    names = frozenset(word for word in words if is_name(word))
+    return numbers, guards, names, negated(words)
+
+
+def guard_terms(word):
+    return GUARD_TERMS.get(word) or GUARD_TERMS.get(word + "s")
+
+
+def is_name(word):
+    return not (
+        word in NEGATIONS or guard_terms(word) or NUMBER_PATTERN.match(word)
+        or word in GENERIC_TERMS or word + "s" in GENERIC_TERMS
+    )
+
+
+def negated(words):
+    """What each negation applies to: "not from casio" -> {("not", "casio")}."""
+    pairs = set()
+    for i, word in enumerate(words):
+        if word in NEGATIONS:
+            target = next((w for w in words[i + 1:] if w not in NEGATION_FILLER), "")
+            pairs.add(("not", target))
+    return frozenset(pairs)
+
+
+def char_ngrams(normalized):
+    padded = f" {normalized} "
+    return Counter(padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1))
+
+
+class QuestionCache:
+    def __init__(self, prompt_version, path=CACHE_PATH):
+        self.prompt_version = prompt_version
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = {"exact": 0, "similar": 0}
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS question_sql (
+                question_key TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                chart TEXT NOT NULL DEFAULT 'none',
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (question_key, prompt_version)
+            )
+        """)
+        if "chart" not in {row[1] for row in self._execute("PRAGMA table_info(question_sql)")}:
+            self._execute("ALTER TABLE question_sql ADD COLUMN chart TEXT NOT NULL DEFAULT 'none'")
+        # Entries written under an older schema/prompt can never be served again
+        self._execute("DELETE FROM question_sql WHERE prompt_version != ?", (prompt_version,))
+        rows = self._execute(
+            "SELECT question_key, question, sql, chart FROM question_sql WHERE prompt_version = ?", (prompt_version,)
+        )
+
+        self.entries = {}                  # question_key -> (question, sql, chart)
+        self.vectors = {}                  # question_key -> {ngram: tf-idf weight}
+        self.postings = defaultdict(set)   # ngram -> question_keys
+        self.doc_freq = Counter()
+        for key, question, sql, chart in rows:
+            self._add(key, question, sql, chart)
+
+    def _execute(self, sql, params=()):
+        # Short-lived connection per statement; safe across Streamlit script threads
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn, conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _add(self, key, question, sql, chart):
+        if key not in self.entries:
+            for gram in char_ngrams(key):
+                self.postings[gram].add(key)
+                self.doc_freq[gram] += 1
+        self.entries[key] = (question, sql, chart)
+        self.vectors.pop(key, None)  # idf changed; vectors are rebuilt lazily
+
+    def _remove(self, key):
+        if self.entries.pop(key, None) is None:
+            return
+        for gram in char_ngrams(key):
+            self.postings[gram].discard(key)
+            self.doc_freq[gram] -= 1
+        self.vectors.clear()
+
+    def _vector(self, key):
+        n_docs = len(self.entries) + 1
+        weights = {
+            gram: (1 + math.log(count)) * math.log(1 + n_docs / (1 + self.doc_freq[gram]))
+            for gram, count in char_ngrams(key).items()
+        }
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {gram: w / norm for gram, w in weights.items()}
+
+    def _most_similar(self, key):
+        query = self._vector(key)
+        query_signature = signature(key)
+        scores = Counter()
+        for gram, weight in query.items():
+            for candidate in self.postings.get(gram, ()):
+                if candidate not in self.vectors:
+                    self.vectors[candidate] = self._vector(candidate)
+                scores[candidate] += weight * self.vectors[candidate].get(gram, 0.0)
+        for candidate, score in scores.most_common(5):
+            if score < SIMILARITY_THRESHOLD:
+                break
+            if signature(candidate) == query_signature:
+                return candidate, score
+        return None, 0.0
+
+    def get(self, question):
+        """(sql, chart, match) where match is ("exact", question, 1.0) or ("similar", question, score); None on a miss."""
+        key = normalize_question(question)
+        with self._lock:
+            if key in self.entries:
+                kind, score = "exact", 1.0
+            else:
+                kind = "similar"
+                key, score = self._most_similar(key)
+            if key is None:
+                self.misses += 1
+                return None
+            self.hits[kind] += 1
+            cached_question, sql, chart = self.entries[key]
+
+        self._execute(
+            "UPDATE question_sql SET hits = hits + 1, last_used_at = ? WHERE question_key = ? AND prompt_version = ?",
+            (time.time(), key, self.prompt_version),
+        )
+        return sql, chart, (kind, cached_question, score)
+
+    def put(self, question, sql, chart="none"):
+        key = normalize_question(question)
+        if not key:
+            return
+        now = time.time()
+        self._execute("""
+            INSERT INTO question_sql (question_key, prompt_version, question, sql, chart, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (question_key, prompt_version)
+            DO UPDATE SET sql = excluded.sql, chart = excluded.chart, last_used_at = excluded.last_used_at
+        """, (key, self.prompt_version, question, sql, chart, now, now))
+        with self._lock:
+            self._add(key, question, sql, chart)
+
+    def forget(self, question):
+        # Called when cached SQL fails to run, so the next ask regenerates it
+        key = normalize_question(question)
+        self._execute("DELETE FROM question_sql WHERE question_key = ? AND prompt_version = ?", (key, self.prompt_version))
+        with self._lock:
+            self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "exact_hits": self.hits["exact"],
+                    "similar_hits": self.hits["similar"], "misses": self.misses}
@@ -0,0 +1,117 @@
+import ast
+import json
+import statistics
+import subprocess
+import sys
+from glob import glob
+from pathlib import Path
+
+# -------------------------------------
+# Cold-start timing for the dashboard scripts
+# -------------------------------------
+# Each script's top-level imports are timed in a fresh interpreter (what a new Streamlit
+# process pays before the first paint), repeated a few times and reported as medians.
+# With --run the whole script is also executed headless through Streamlit's AppTest,
+# which needs the usual secrets but shows the full first-render time and which heavy
+# modules the first render actually loaded (lazy imports inside functions included).
+#
+#   python -m dashboard.startup [--repeat N] [--run]
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ["Home Page.py", *sorted(str(Path(p).relative_to(ROOT)) for p in glob(str(ROOT / "pages" / "*.py")))]
+REPEAT = 5
+# Should only load on first use, never on a plain page load
+HEAVY_MODULES = ["google.generativeai", "duckdb", "plotly", "pyarrow", "PIL", "scipy", "statsmodels"]
+
+IMPORT_PROBE = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+timings, start = {{}}, time.perf_counter()
+for name in {modules!r}:
+    t = time.perf_counter()
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        timings[name] = f"{{type(e).__name__}}: {{e}}"
+        continue
+    timings[name] = time.perf_counter() - t
+print(json.dumps({{"total": time.perf_counter() - start, "imports": timings}}))
+"""
+
+RUN_PROBE = """
+import json, os, sys, time
+os.chdir({root!r})
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+preloaded = set(sys.modules)
+app = AppTest.from_file({script!r}, default_timeout=120).run()
+loaded = [name for name in {heavy!r} if name in sys.modules and name not in preloaded]
+print(json.dumps({{"total": time.perf_counter() - start, "errors": [str(e.value) for e in app.exception], "heavy": loaded}}))
+"""
+
+
+def top_level_imports(script):
+    """Module names imported at the top level of `script`, in order (function-level imports are lazy and skipped)."""
+    tree = ast.parse((ROOT / script).read_text(encoding="utf-8"))
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def probe(code):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if out.returncode != 0:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def time_imports(script, repeat=REPEAT):
+    modules = top_level_imports(script)
+    runs = [probe(IMPORT_PROBE.format(root=str(ROOT), modules=modules)) for _ in range(repeat)]
+    ok = [run for run in runs if "error" not in run]
+    if not ok:
+        return {"error": runs[0]["error"]}
+    per_import = {}
+    for name in modules:
+        values = [run["imports"][name] for run in ok]
+        numbers = [v for v in values if isinstance(v, float)]
+        per_import[name] = statistics.median(numbers) if numbers else values[0]
+    return {"total": statistics.median(run["total"] for run in ok), "imports": per_import}
+
+
+def time_run(script, repeat=REPEAT):
+    runs = [probe(RUN_PROBE.format(root=str(ROOT), script=script, heavy=HEAVY_MODULES)) for _ in range(repeat)]
+    ok = [run for run in runs if "error" not in run]
+    if not ok:
+        return {"error": runs[0]["error"]}
+    return {"total": statistics.median(run["total"] for run in ok), "errors": ok[-1]["errors"], "heavy": ok[-1]["heavy"]}
+
+
+def report(repeat=REPEAT, run=False):
+    for script in SCRIPTS:
+        result = time_imports(script, repeat)
+        if "error" in result:
+            print(f"❌ {script}: {result['error']}")
+            continue
+        print(f"⏱️ {script}: imports {result['total'] * 1000:.0f} ms (median of {repeat})")
+        for name, seconds in sorted(result["imports"].items(), key=lambda kv: -kv[1] if isinstance(kv[1], float) else 0):
+            cost = f"{seconds * 1000:8.1f} ms" if isinstance(seconds, float) else f"  failed: {seconds}"
+            print(f"    {cost}  {name}")
+        if run:
+            result = time_run(script, repeat)
+            if "error" in result:
+                print(f"    ❌ cold run failed: {result['error']}")
+            else:
+                print(f"    🚀 cold run {result['total'] * 1000:.0f} ms" + "".join(f"\n    ⚠️ {e}" for e in result["errors"]))
+                print(f"    📦 heavy modules loaded by first render: {', '.join(result['heavy']) or 'none'}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = int(args[args.index("--repeat") + 1]) if "--repeat" in args else REPEAT
+    report(repeat, run="--run" in args)
@@ -0,0 +1,205 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+# -------------------------------------
+# Local product thumbnails
+# -------------------------------------
+# Each ImageURL is downloaded once, resized to the card height, re-encoded as WebP and
+# stored under its content hash. manifest.json maps source URL -> file name. Cards use
+# the local file when the manifest has it and the original CDN URL otherwise.
+#
+# Only serve() sends the long-lived "immutable" Cache-Control header. Streamlit's own
+# app/static route (the page default) does not set it, so point THUMBNAIL_BASE_URL at
+# serve() or a proxy/CDN in front of THUMB_DIR to get browser caching.
+#
+#   python -m dashboard.thumbnails build          # fetch thumbnails for the final datasets
+#   python -m dashboard.thumbnails serve [port]   # serve them with long-lived cache headers
+#   python -m dashboard.thumbnails check          # build + serve against a local stand-in CDN
+
+THUMB_DIR = os.environ.get("THUMB_DIR", os.path.join("static", "thumbs"))
+THUMB_HEIGHT = 240
+WEBP_QUALITY = 80
+FETCH_TIMEOUT_S = 10
+MANIFEST_FILE = "manifest.json"
+
+
+def load_manifest(thumb_dir=THUMB_DIR) -> dict:
+    path = os.path.join(thumb_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, thumb_dir=THUMB_DIR):
+    path = os.path.join(thumb_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def fetch_image(url) -> bytes:
+    request = Request(url, headers={"User-Agent": "Mozilla/5.0 (thumbnail-cache)"})
+    with urlopen(request, timeout=FETCH_TIMEOUT_S) as response:
+        return response.read()
+
+
+def make_thumbnail(image_bytes: bytes, height=THUMB_HEIGHT) -> bytes:
+    from PIL import Image  # only the build step needs Pillow, not the Best Sellers page
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        if img.height > height:
+            img = img.resize((max(1, round(img.width * height / img.height)), height), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="WEBP", quality=WEBP_QUALITY, method=6)
+        return out.getvalue()
+
+
+def store_thumbnail(url, thumb_dir=THUMB_DIR, fetch=fetch_image):
+    """Downloads and stores one thumbnail; returns its file name (content hash)."""
+    thumb = make_thumbnail(fetch(url))
+    name = f"{hashlib.sha256(thumb).hexdigest()[:32]}.webp"
+    path = os.path.join(thumb_dir, name)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(thumb)
+        os.replace(tmp_path, path)
+    return name
+
+
+def build_thumbnails(urls, thumb_dir=THUMB_DIR, fetch=fetch_image, max_workers=8) -> dict:
+    """
+    Fetches every URL not yet in the manifest (duplicates and blanks skipped) and returns
+    the updated manifest. `fetch` can be swapped out, e.g. to point at a local test server.
+    """
+    os.makedirs(thumb_dir, exist_ok=True)
+    manifest = load_manifest(thumb_dir)
+    pending = sorted({
+        url for url in urls
+        if isinstance(url, str) and url.startswith("http")
+        and not (url in manifest and os.path.exists(os.path.join(thumb_dir, manifest[url])))
+    })
+
+    def fetch_one(url):
+        try:
+            return url, store_thumbnail(url, thumb_dir, fetch)
+        except Exception as e:
+            print(f"❌ Thumbnail failed for {url}: {e}")
+            return url, None
+
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for url, name in pool.map(fetch_one, pending):
+            if name:
+                manifest[url] = name
+                fetched += 1
+
+    save_manifest(manifest, thumb_dir)
+    print(f"🖼️ Thumbnails: fetched {fetched}/{len(pending)}, {len(manifest)} in manifest")
+    return manifest
+
+
+def thumbnail_urls(image_urls: pd.Series, manifest: dict, base_url) -> pd.Series:
+    # Local thumbnail where we have one, original CDN URL otherwise
+    local = image_urls.map(manifest).astype("string")  # all-missing maps to float NaN otherwise
+    return (base_url.rstrip("/") + "/" + local).where(local.notna(), image_urls)
+
+
+class ThumbnailHandler(SimpleHTTPRequestHandler):
+    # File names are content hashes, so a file never changes once served
+    def end_headers(self):
+        if self.path.endswith(".webp"):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        super().end_headers()
+
+
+def serve(port=8502, thumb_dir=THUMB_DIR):
+    handler = partial(ThumbnailHandler, directory=thumb_dir)
+    with ThreadingHTTPServer(("0.0.0.0", port), handler) as server:
+        print(f"🖼️ Serving {thumb_dir} on :{port}")
+        server.serve_forever()
+
+
+def check():
+    """Builds thumbnails from a local stand-in CDN, then checks the fallback and the headers serve() sends."""
+    from tempfile import TemporaryDirectory
+    from PIL import Image
+
+    source = io.BytesIO()
+    Image.new("RGB", (600, 480), "navy").save(source, format="PNG")
+
+    class StandInCDN(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/watch.png":
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.end_headers()
+            self.wfile.write(source.getvalue())
+
+        def log_message(self, *args):
+            pass
+
+    with TemporaryDirectory() as thumb_dir, ThreadingHTTPServer(("127.0.0.1", 0), StandInCDN) as cdn:
+        threading.Thread(target=cdn.serve_forever, daemon=True).start()
+        found, missing = (f"http://127.0.0.1:{cdn.server_port}/{name}" for name in ("watch.png", "gone.png"))
+        manifest = build_thumbnails([found, missing, found, None], thumb_dir=thumb_dir)
+        cdn.shutdown()
+        assert found in manifest and missing not in manifest, manifest
+
+        class QuietThumbnailHandler(ThumbnailHandler):
+            def log_message(self, *args):
+                pass
+
+        with ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietThumbnailHandler, directory=thumb_dir)) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+            urls = thumbnail_urls(pd.Series([found, missing]), manifest, base_url)
+            assert urls[1] == missing, urls  # no thumbnail -> original URL
+            with urlopen(urls[0], timeout=FETCH_TIMEOUT_S) as response:
+                cache_control = response.headers.get("Cache-Control", "")
+                with Image.open(io.BytesIO(response.read())) as img:
+                    size = (img.format, img.height)
+            server.shutdown()
+        assert "immutable" in cache_control and "max-age=31536000" in cache_control, cache_control
+        assert size == ("WEBP", THUMB_HEIGHT), size
+    print("✅ Thumbnails: stand-in fetch, WebP resize, fallback and cache headers OK")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if command == "serve":
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8502)
+    elif command == "check":
+        check()
+    else:
+        from urllib.parse import quote_plus
+        from sqlalchemy import create_engine
+        from segments import SEGMENTS
+
+        db = os.environ["SUPABASE_DB"]
+        user = os.environ["SUPABASE_USER"]
+        raw_password = os.environ["SUPABASE_PASSWORD"]
+        host = os.environ["SUPABASE_HOST"]
+        port = os.environ["SUPABASE_PORT"]
+        password = quote_plus(raw_password)
+        engine = create_engine(f"postgresql://{user}:{password}@{host}:{port}/{db}")
+
+        urls = []
+        for segment in SEGMENTS:
+            urls.extend(pd.read_sql_query(f'SELECT "ImageURL" FROM "{segment.final_output}"', engine)["ImageURL"])
+        build_thumbnails(urls)
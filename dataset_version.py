@@ -0,0 +1,59 @@
+import os
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
+from urllib.parse import quote_plus
+
+# -------------------------------------
+# Dataset version record
+# -------------------------------------
+# One-row table bumped whenever the pipeline publishes its *_output tables. Dashboards
+# key their caches on this number (a single-row read) instead of expiring on a timer,
+# so they reload exactly once per publish. Listeners can also LISTEN on the channel.
+
+VERSION_TABLE = "dataset_version"
+VERSION_CHANNEL = "dataset_version"
+
+
+def publish_dataset_version(engine, note="") -> int:
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+                id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version BIGINT NOT NULL,
+                published_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                note TEXT
+            )
+        """))
+        version = conn.execute(text(f"""
+            INSERT INTO {VERSION_TABLE} (id, version, published_at, note) VALUES (1, 1, now(), :note)
+            ON CONFLICT (id) DO UPDATE
+            SET version = {VERSION_TABLE}.version + 1, published_at = now(), note = EXCLUDED.note
+            RETURNING version
+        """), {"note": note}).scalar_one()
+        conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": VERSION_CHANNEL, "payload": str(version)})
+    return version
+
+
+def get_dataset_version(engine) -> int:
+    # 0 until the pipeline has published once
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(f"SELECT version FROM {VERSION_TABLE} WHERE id = 1")).scalar() or 0
+    except ProgrammingError:
+        return 0
+
+
+# -------------------------------------
+# Run as the last pipeline step
+# -------------------------------------
+if __name__ == "__main__":
+    db = os.environ["SUPABASE_DB"]
+    user = os.environ["SUPABASE_USER"]
+    raw_password = os.environ["SUPABASE_PASSWORD"]
+    host = os.environ["SUPABASE_HOST"]
+    port = os.environ["SUPABASE_PORT"]
+    password = quote_plus(raw_password)
+
+    engine = create_engine(f"postgresql://{user}:{password}@{host}:{port}/{db}")
+    version = publish_dataset_version(engine, note=os.environ.get("GITHUB_SHA", "manual"))
+    print(f"✅ Published dataset version {version}")
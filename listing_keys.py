@@ -0,0 +1,47 @@
+import pandas as pd
+from sqlalchemy import text
+
+# -------------------------------------
+# Canonical listing key from Amazon URLs
+# -------------------------------------
+# Scraped links are ~700 bytes of tracking parameters (dib=, qid=, refinements=...).
+# The ASIN in the /dp/<ASIN> segment identifies the listing, so we join and dedup on
+# that and keep the full link in a side column.
+
+AMAZON_BASE_URL = "https://www.amazon.in"
+
+# Sponsored links (/sspa/click?...&url=%2F...%2Fdp%2FB09H3DLKSS) carry the target URL-encoded
+ASIN_PATTERN = r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?=[/?&#]|$)"
+
+
+def extract_asin(urls: pd.Series) -> pd.Series:
+    decoded = urls.astype("string").str.replace(r"(?i)%2F", "/", regex=True)
+    return decoded.str.extract(ASIN_PATTERN, expand=False)
+
+
+def canonical_url(asins: pd.Series) -> pd.Series:
+    return AMAZON_BASE_URL + "/dp/" + asins
+
+
+def add_listing_key(df: pd.DataFrame, url_col: str, key_col="asin", source_col="source_url") -> pd.DataFrame:
+    """
+    Adds the ASIN as `key_col`, moves the original link to `source_col` and replaces
+    `url_col` with the short /dp/<ASIN> form. Rows without a recognisable ASIN keep
+    their original link (and any ASIN already present in `key_col`).
+    """
+    asins = extract_asin(df[url_col])
+    if key_col in df.columns:
+        existing = df[key_col].astype("string").str.strip().replace("", pd.NA)
+        asins = asins.fillna(existing)
+
+    df[source_col] = df[url_col]
+    df[key_col] = asins
+    df[url_col] = canonical_url(asins).fillna(df[url_col])
+    return df
+
+
+def create_listing_key_index(engine, table_name: str, key_col="asin"):
+    # to_sql(if_exists="replace") drops the table's indexes, so call this after every write
+    index_name = f"ix_{table_name}_{key_col}".lower().replace(" ", "_")[:63]
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ("{key_col}")'))
@@ -1,49 +1,58 @@
 
+import hashlib
+from concurrent.futures import TimeoutError as FutureTimeout
 import streamlit as st
 import pandas as pd
-import google.generativeai as genai
-from sqlalchemy import create_engine
-import plotly.express as px
-from urllib.parse import quote_plus
+from dashboard.charts import render_chart
+from dashboard.db import get_engine, get_query_engine, pool_metrics, current_dataset_version
+from dashboard.guardrails import MAX_COST, MAX_ROWS, TIMEOUT_MS, GuardrailError, collect, stream_guarded
+from dashboard.intents import route_question
+from dashboard.llm import ANSWER_FORMAT, MAX_CONCURRENCY, RATE_PER_MINUTE, LLMBroker, LLMError, StubModel
+from dashboard.search import SEARCH_COLUMNS, SearchIndex
+from dashboard.result_cache import ResultCache
+from dashboard.schema import introspect_schemas, schema_prompt
+from dashboard.sql_cache import QuestionCache
+from segments import SEGMENTS
 
 # ---- Gemini Setup ----
-genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-model = genai.GenerativeModel("gemini-2.0-flash-lite")
-
-# ---- Supabase Connection ----
-DB = st.secrets["SUPABASE_DB"]
-USER = st.secrets["SUPABASE_USER"]
-PASSWORD = quote_plus(st.secrets["SUPABASE_PASSWORD"])
-HOST = st.secrets["SUPABASE_HOST"]
-PORT = st.secrets["SUPABASE_PORT"]
-connection_string = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB}"
-engine = create_engine(connection_string)
+MODEL_NAME = st.secrets.get("LLM_MODEL", "gemini-2.0-flash-lite")
+
+@st.cache_resource
+def broker_holder():
+    # Filled by llm_broker(); lets the sidebar show metrics without building the client
+    return {}
+
+@st.cache_resource
+def llm_broker():
+    # One broker per process for every Gemini call; LLM_MODEL = "stub" runs offline
+    limits = {
+        "max_concurrency": int(st.secrets.get("LLM_MAX_CONCURRENCY", MAX_CONCURRENCY)),
+        "rate_per_minute": float(st.secrets.get("LLM_RATE_PER_MINUTE", RATE_PER_MINUTE)),
+    }
+    if MODEL_NAME == "stub":
+        broker = LLMBroker(StubModel(), **limits)
+    else:
+        import google.generativeai as genai  # heavy; only loaded once a question needs the LLM
+        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+        broker = LLMBroker(genai.GenerativeModel(MODEL_NAME), **limits)
+    broker_holder()["broker"] = broker
+    return broker
+
+# ---- Supabase Connection (shared pooled engine) ----
+engine = get_engine()
+# Generated SQL runs on its own read-only pool (read-only sessions, SQL_READONLY_USER when set)
+query_engine = get_query_engine()
 
 # ---- Table Metadata ----
-TABLE_SCHEMAS = {
-    "product_price_cleaned_output": ["product_url", "product_name", "product_price", "product_code", "brand"],
-    "All - Product Count_output": ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "<10k"],
-    "All - SKU Count_output": ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "<10k"],
-    "Top 1000 - Product Count_output": ["brand", "Top 1000 Product Count"],
-    "Top 1000 - SKU Count_output": ["brand", "Top 1000 SKU Count"],
-    "Men - Product Count_output": ["brand", "Men - Product Count"],
-    "Men - SKU Count_output": ["brand", "Men - SKU Count"],
-    "Women - Product Count_output": ["brand", "Women - Product Count"],
-    "Women - SKU Count_output": ["brand", "Women - SKU Count"],
-    "Best Rank_All_output": ["brand", "Best Rank (First Appearance)"],
-    "men_price_range_top100_output": ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "total"],
-    "women_price_range_top100_output": ["brand", "10k–15k", "15k–25k", "25k–40k", "40k+", "total"],
-    "Final_Watch_Dataset_Men_output": ["URL", "Brand", "Product Name", "Model Number", "Price", "Ratings", "Discount", "Band Colour", "Band Material", "Band Width", "Case Diameter", "Case Material", "Case Thickness", "Dial Colour", "Crystal Material", "Case Shape", "Movement", "Water Resistance Depth", "Special Features", "ImageURL"],
-    "Final_Watch_Dataset_Women_output": ["URL", "Brand", "Product Name", "Model Number", "Price", "Ratings", "Discount", "Band Colour", "Band Material", "Band Width", "Case Diameter", "Case Material", "Case Thickness", "Dial Colour", "Crystal Material", "Case Shape", "Movement", "Water Resistance Depth", "Special Features", "ImageURL"]
-}
+# Columns are introspected from the database once per dataset version; each prompt only
+# lists the tables relevant to the question (dashboard/schema.py)
+@st.cache_data(max_entries=4, show_spinner=False)
+def table_schemas(version):
+    return introspect_schemas(engine)
 
 # ---- LLM SQL Generator ----
-def generate_sql(user_query):
-    # Table schema list as bullet points
-    schema_desc = "\n".join([f"- {table}: [{', '.join(cols)}]" for table, cols in TABLE_SCHEMAS.items()])
-    
-    # Rules for selecting the correct table
-    table_guidance = """
+# Rules for selecting the correct table
+TABLE_GUIDANCE = """
 The tables contain watch data from Amazon across brands.
 Do NOT access or reference any data from the table rows. Only use table names and their column names provided above.
 
@@ -74,55 +83,205 @@ Refer to the user’s question and select the correct table using the rules belo
 
 9. Always try to show the comparision factor, sum, total etc. along with the output
 10. Avoid cases where Brand = "Others", unless specified explicitly
+11. `Final_Watch_Dataset_*_output` has a JSONB column "Specs" with every spec key/value of a listing (keys like "Crystal Material", "Water Resistance Depth", "Bezel Material").
+    For attributes without their own column, filter with containment, e.g. "Specs" @> '{"Crystal Material": "Sapphire"}'
 """
 
-    # Compose the full prompt to send to Gemini
-    prompt = f"""
+def build_prompt(user_query, schemas):
+    # Relevant tables and their columns as bullet points
+    schema_desc = schema_prompt(user_query, schemas)
+
+    return f"""
 You are a SQL expert agent working with PostgreSQL.
 
 Below are the available tables and their columns:
 {schema_desc}
 
-{table_guidance}
+{TABLE_GUIDANCE}
 
 Now, based on the user's question below, choose the right table and generate the SQL query.
 
 User Question: {user_query}
+{ANSWER_FORMAT}"""
+
+def prompt_version(schemas):
+    # Cached SQL is only reused while schemas, rules and model are unchanged
+    return hashlib.sha256(f"{MODEL_NAME}\n{build_prompt('', schemas)}".encode()).hexdigest()[:16]
+
+def generate_answer(user_query, schemas):
+    """Future resolving to (sql, chart type) from a single Gemini call."""
+    return llm_broker().submit_answer(build_prompt(user_query, schemas))
+
+# Upper bound on waiting for the broker (it has its own per-attempt timeout and retries)
+ANSWER_WAIT_S = 120
+
+def pending_answer(user_query, schemas):
+    # One Future per question per session: started when the question is entered,
+    # reruns (e.g. clicking Run) pick up the same call instead of issuing a new one.
+    # Finished answers for other questions are dropped; calls still running are kept.
+    answers = st.session_state.setdefault("pending_answers", {})
+    key = (prompt_version(schemas), user_query)
+    if key not in answers:
+        for other in [k for k, future in answers.items() if future.done()]:
+            del answers[other]
+        answers[key] = generate_answer(user_query, schemas)
+    return answers[key]
+
+def forget_answer(user_query, schemas):
+    st.session_state.get("pending_answers", {}).pop((prompt_version(schemas), user_query), None)
+
+@st.cache_resource(max_entries=2)
+def question_cache(version):
+    # Shared by all sessions; persisted in a local SQLite file
+    return QuestionCache(version)
+
+# ---- Query Results ----
+# Generated SQL is checked (single read-only SELECT), cost-checked with EXPLAIN,
+# timeout-bounded and row-capped before it touches the shared database
+QUERY_LIMITS = {
+    "max_cost": float(st.secrets.get("SQL_MAX_COST", MAX_COST)),
+    "timeout_ms": int(st.secrets.get("SQL_TIMEOUT_MS", TIMEOUT_MS)),
+    "max_rows": int(st.secrets.get("SQL_MAX_ROWS", MAX_ROWS)),
+}
 
-Only return the SQL query.
-"""
-
-    # Call Gemini to generate the SQL
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Gemini failed: {e}"
+@st.cache_resource
+def result_cache():
+    # One LRU for every session; keys include the dataset version, so a publish invalidates it
+    return ResultCache(max_bytes=int(st.secrets.get("RESULT_CACHE_MB", 64)) * 1024 * 1024)
 
-# ---- Visualization Type ----
-def infer_chart_type(query):
-    prompt = f"""
-Suggest a chart type (bar, pie, line, scatter, none) to visualize the result of this question:
+# Embedded mode: run SQL in-process with DuckDB over the published snapshots
+EMBEDDED_ENGINE = st.secrets.get("ASK_QUERY_ENGINE", "postgres") == "duckdb"
 
-"{query}"
+@st.cache_resource(max_entries=2)
+def embedded_catalog(version):
+    from dashboard.embedded import EmbeddedCatalog  # imports duckdb; only in embedded mode
+    return EmbeddedCatalog(engine, list(table_schemas(version)), version)
 
-Answer only with the chart type, no explanation.
-"""
-    try:
-        result = model.generate_content(prompt).text.strip().lower()
-        return result if result in ["bar", "pie", "line", "scatter"] else "none"
-    except:
-        return "none"
+def stream_query(sql, params, version):
+    """DataFrame chunks of the result; embedded engine first when enabled, Supabase otherwise."""
+    if EMBEDDED_ENGINE:
+        from dashboard.embedded import EmbeddedError
+        try:
+            # In-process and row-capped, so read it all: a DuckDB error in any chunk
+            # still falls back to Supabase before anything has been shown
+            chunks = list(embedded_catalog(version).stream(sql, params, QUERY_LIMITS["timeout_ms"], QUERY_LIMITS["max_rows"]))
+        except EmbeddedError as e:
+            print(f"❌ Embedded engine could not run the query, using Supabase: {e}")
+        else:
+            yield from chunks
+            return
+    yield from stream_guarded(query_engine, sql, params, **QUERY_LIMITS)
+
+def show_streamed(chunks, max_rows):
+    # First chunk renders right away; each later chunk redraws the same placeholder with
+    # the rows so far (results are capped at max_rows, so this stays cheap)
+    status, table, frames, rows = st.empty(), st.empty(), [], 0
+    for chunk in chunks:
+        frames.append(chunk)
+        rows += len(chunk)
+        table.dataframe(collect(frames).head(max_rows))  # the extra cap-detection row is not shown
+        status.caption(f"⏳ {min(rows, max_rows):,} rows loaded…")
+    status.caption(f"{min(rows, max_rows):,} rows")
+    return collect(frames)
+
+# ---- Intent Router (no LLM call) ----
+@st.cache_data(max_entries=4, show_spinner=False)
+def known_brands(version):
+    return pd.read_sql_query('SELECT DISTINCT brand FROM "All - Product Count_output" WHERE brand IS NOT NULL', engine)["brand"].tolist()
+
+# ---- Product Lookup (no LLM call) ----
+LOOKUP_COLUMNS = ["Brand", "Product Name", "Model Number", "Price", "Ratings", "URL"]
+
+@st.cache_resource(max_entries=2)
+def load_product_search(version):
+    from dashboard.snapshots import ensure_snapshot  # imports pyarrow; only once a lookup is made
+    indexes = {}
+    for segment in SEGMENTS:
+        snapshot = ensure_snapshot(engine, segment.final_output, version)
+        columns = [col for col in [*SEARCH_COLUMNS, "Specs"] if col in snapshot.column_names]
+        indexes[segment.gender] = (snapshot, SearchIndex.from_frame(snapshot.select(columns).to_pandas()))
+    return indexes
+
+def lookup_products(query, limit=10):
+    frames = []
+    for gender, (snapshot, index) in load_product_search(current_dataset_version()).items():
+        hits = index.search(query, limit=limit)
+        if hits is not None and len(hits):  # None: nothing searchable in the query (e.g. "?")
+            columns = [col for col in LOOKUP_COLUMNS if col in snapshot.column_names]
+            frames.append(snapshot.take(hits).select(columns).to_pandas().assign(Segment=gender))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 # ---- Streamlit UI ----
 st.set_page_config("Marketplace Analyzer", layout="wide")
 st.title("Marketplace Analyzer")
 
+schemas = table_schemas(current_dataset_version())
+answer_cache = question_cache(prompt_version(schemas))
+
+with st.sidebar.expander("Connection pool"):
+    st.json(pool_metrics(engine))
+
+with st.sidebar.expander("LLM broker"):
+    broker = broker_holder().get("broker")
+    if broker is None:
+        st.caption("Not started yet (no question has needed the LLM).")
+    else:
+        st.json(broker.metrics())
+
+with st.sidebar.expander("Question cache"):
+    st.json(answer_cache.stats())
+
+with st.sidebar.expander("Result cache"):
+    st.json(result_cache().stats())
+
+with st.expander("🔎 Find a watch (model number, brand, name or spec)"):
+    lookup = st.text_input("Search products", key="product_lookup")
+    if lookup:
+        matches = lookup_products(lookup)
+        if matches.empty:
+            st.info("No matching products.")
+        else:
+            st.dataframe(matches)
+
 user_question = st.text_input("Ask a question about your data:")
 
 if user_question:
-    with st.spinner("Generating SQL..."):
-        sql_query = generate_sql(user_question)
+    # Known question types first, then the question cache, then Gemini
+    query_params = {}
+    # Where this question's SQL came from is decided once and kept until the question changes,
+    # so the cache entry written for a fresh Gemini answer is not labelled as a cache hit
+    source_key = (prompt_version(schemas), user_question)
+    if st.session_state.get("answer_source", (None, None))[0] != source_key:
+        st.session_state.answer_source = (source_key, None)
+    generated_here = st.session_state.answer_source[1] == "llm"
+    routed = route_question(user_question, known_brands(current_dataset_version()), table_columns=schemas)
+    cached = None if routed else answer_cache.get(user_question)
+    if routed:
+        sql_query, query_params, chart_type = routed.sql, routed.params, routed.chart
+        st.caption(f"🧭 Recognized question type: {routed.intent} (no LLM call)")
+    elif cached:
+        sql_query, chart_type, (match, cached_question, score) = cached
+        if generated_here:
+            st.caption("🤖 SQL generated by Gemini")
+        elif match == "exact":
+            st.caption("⚡ Answered from the question cache")
+        else:
+            st.caption(f"⚡ Answered from the question cache (similar to “{cached_question}”, {score:.0%})")
+    else:
+        cached_question = user_question
+        # The call runs on the broker and the rest of the page is already drawn; wait here once
+        with st.spinner("Generating SQL..."):
+            try:
+                sql_query, chart_type = pending_answer(user_question, schemas).result(timeout=ANSWER_WAIT_S)
+            except FutureTimeout:
+                st.warning("Gemini is still working on this question; press Enter again to check.")
+                st.stop()
+            except LLMError as e:
+                forget_answer(user_question, schemas)  # retry on the next rerun
+                st.error(f"Gemini failed: {e}")
+                st.stop()
+        st.session_state.answer_source = (source_key, "llm")
+        st.caption("🤖 SQL generated by Gemini")
 
     if sql_query.lower().startswith("invalid_query"):
         st.warning("Couldn't understand or match your question to a known table.")
@@ -130,25 +289,35 @@ if user_question:
 
     clean_query = sql_query.strip().replace("```sql", "").replace("```", "").strip()
     st.code(clean_query, language="sql")
+    if query_params:
+        st.caption(f"Parameters: {query_params}")
+    if not cached and not routed:
+        answer_cache.put(user_question, clean_query, chart_type)
+        forget_answer(user_question, schemas)  # the question cache serves it from now on
 
     if st.button("▶️ Run Query"):
         try:
-            df = pd.read_sql_query(clean_query, engine)
-            st.success("Query executed successfully!")
-            st.dataframe(df)
-
-            if not df.empty:
-                chart_type = infer_chart_type(user_question)
-                if chart_type == "bar":
-                    st.bar_chart(df.set_index(df.columns[0]))
-                elif chart_type == "line":
-                    st.line_chart(df.set_index(df.columns[0]))
-                elif chart_type == "pie" and df.shape[1] >= 2:
-                    fig = px.pie(df, names=df.columns[0], values=df.columns[1])
-                    st.plotly_chart(fig)
-                elif chart_type == "scatter" and df.shape[1] >= 2:
-                    fig = px.scatter(df, x=df.columns[0], y=df.columns[1])
-                    st.plotly_chart(fig)
-
+            max_rows = QUERY_LIMITS["max_rows"]
+            version = current_dataset_version()
+            df = result_cache().get(clean_query, query_params, version)
+            if df is not None:
+                st.success("Query executed successfully! (served from the result cache)")
+                st.dataframe(df.head(max_rows))
+            else:
+                df = show_streamed(stream_query(clean_query, query_params, version), max_rows)
+                result_cache().put(clean_query, query_params, version, df)
+                st.success("Query executed successfully!")
+
+            if len(df) > max_rows:
+                st.warning(f"Showing the first {max_rows:,} rows; refine the question for the rest.")
+                df = df.head(max_rows)
+            render_chart(df, chart_type)
+
+        except GuardrailError as e:
+            if not routed:
+                answer_cache.forget(cached_question)
+            st.error(f"Query blocked: {e}")
         except Exception as e:
+            if not routed:
+                answer_cache.forget(cached_question)  # regenerate next time
             st.error(f"Query failed: {e}")
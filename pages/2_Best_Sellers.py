@@ -1,153 +1,221 @@
+import os
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
-
-# ---- Supabase DB Connection ----
-DB = st.secrets["SUPABASE_DB"]
-USER = st.secrets["SUPABASE_USER"]
-PASSWORD = quote_plus(st.secrets["SUPABASE_PASSWORD"])
-HOST = st.secrets["SUPABASE_HOST"]
-PORT = st.secrets["SUPABASE_PORT"]
-engine = create_engine(f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB}")
-
-@st.cache_data(ttl=600)
-def load_data(table_name):
-    df = pd.read_sql_table(table_name, con=engine)
-    df["Price"] = pd.to_numeric(df["Price"].str.replace(",", "").fillna("0"), errors="coerce").astype(int)
-    return df
+import numpy as np
+from segments import SEGMENTS
+from dashboard.db import get_engine, current_dataset_version
+from dashboard.facets import FacetIndex
+from dashboard.catalog import CatalogSummary, KEY_COL, count_matches, fetch_by_ranks, fetch_page, rank_at
+from dashboard.snapshots import ensure_snapshot
+from dashboard.grid import rank_list, render_grid_html
+from dashboard.search import SEARCH_COLUMNS, SearchIndex
+from dashboard.thumbnails import THUMB_DIR, MANIFEST_FILE, load_manifest, thumbnail_urls
+
+# ---- Supabase DB Connection (shared pooled engine) ----
+engine = get_engine()
+
+# Facet column -> sidebar label
+FACETS = {
+    "Brand": "Brand",
+    "Dial Colour": "Dial Colour",
+    "Case Shape": "Dial Shape",
+    "Band Colour": "Band Colour",
+    "Band Material": "Band Material",
+    "Movement": "Movement",
+}
+RANGE_COLUMNS = ["Price", "Case Diameter (mm)"]
+
+PAGE_SIZES = [20, 40, 80]
+
+# Columns a "More like this" link needs (neighbours come from the published "Similar Ranks")
+SIMILAR_COLUMNS = [KEY_COL, "URL", "ImageURL", "Product Name", "Brand", "Model Number", "Price", "Ratings", "Discount"]
+
+# Local WebP thumbnails (python -m dashboard.thumbnails build). Streamlit static serving is the
+# default but sends no long-lived cache headers; point this at `dashboard.thumbnails serve` for them
+THUMBNAIL_BASE_URL = st.secrets.get("THUMBNAIL_BASE_URL", "app/static/thumbs")
+
+# Query-backed mode: filter and paginate in Postgres instead of loading the table per session
+QUERY_MODE = st.secrets.get("BEST_SELLERS_QUERY_MODE", False)
+
+# Caches below are keyed on the published dataset version instead of a TTL: they reload
+# once after each pipeline publish and never otherwise. Old versions age out via max_entries.
+@st.cache_resource(max_entries=4)
+def load_snapshot(table_name, version):
+    # Read-only, memory-mapped Arrow table shared by every session (values are
+    # normalized by the pipeline at publish time). Only the visible page becomes pandas.
+    return ensure_snapshot(engine, table_name, version)
+
+@st.cache_resource(max_entries=4)
+def load_facet_index(table_name, version):
+    snapshot = load_snapshot(table_name, version)
+    columns = [col for col in ["price_band", *FACETS, *RANGE_COLUMNS] if col in snapshot.column_names]
+    return FacetIndex(snapshot.select(columns).to_pandas(), ["price_band", *FACETS], RANGE_COLUMNS)
+
+@st.cache_resource(max_entries=4)
+def load_catalog_summary(table_name, version):
+    return CatalogSummary(engine, table_name, ["price_band", *FACETS], RANGE_COLUMNS)
+
+@st.cache_data(max_entries=1000)
+def cached_count(table_name, version, selections, ranges, search):
+    return count_matches(engine, table_name, selections, ranges, search)
+
+@st.cache_data(max_entries=1000)
+def cached_rank_at(table_name, version, offset, selections, ranges, search):
+    return rank_at(engine, table_name, offset, selections, ranges, search)
+
+@st.cache_data(max_entries=1000)
+def cached_page(table_name, version, after_rank, page_size, selections, ranges, search):
+    return fetch_page(engine, table_name, after_rank, page_size, selections, ranges, search)
+
+def query_page(table, version, selections, ranges, search, page_number, page_size):
+    # Last rank of every page already shown, for the current filter combination only
+    signature = (table, version, page_size, repr(selections), repr(ranges), search)
+    if st.session_state.get("page_keys_signature") != signature:
+        st.session_state.page_keys_signature = signature
+        st.session_state.page_keys = {0: 0}
+    keys = st.session_state.page_keys
+
+    total_items = cached_count(table, version, selections, ranges, search)
+    after_rank = keys.get(page_number - 1)
+    if after_rank is None:
+        after_rank = cached_rank_at(table, version, (page_number - 1) * page_size - 1, selections, ranges, search)
+    if after_rank is None:
+        return pd.DataFrame(), total_items
+
+    paged_df = cached_page(table, version, after_rank, page_size, selections, ranges, search)
+    if not paged_df.empty:
+        keys[page_number] = int(paged_df[KEY_COL].iloc[-1])
+    return paged_df, total_items
+
+@st.cache_resource(max_entries=4)
+def load_rank_positions(table_name, version):
+    # Rank -> snapshot row, so each card's neighbours are direct lookups
+    ranks = load_snapshot(table_name, version).column(KEY_COL).to_numpy()
+    return pd.Series(np.arange(len(ranks)), index=ranks)
+
+@st.cache_data(max_entries=1000)
+def cached_similar(table_name, version, ranks):
+    return fetch_by_ranks(engine, table_name, ranks, SIMILAR_COLUMNS)
+
+def similar_watches(table, version, paged_df):
+    if "Similar Ranks" not in paged_df.columns:
+        return None
+    ranks = sorted({rank for value in paged_df["Similar Ranks"] for rank in rank_list(value)})
+    if QUERY_MODE:
+        similar_df = cached_similar(table, version, tuple(ranks))
+    else:
+        positions = load_rank_positions(table, version).reindex(ranks).dropna().astype(int)
+        similar_df = load_snapshot(table, version).take(positions.to_numpy()).select(SIMILAR_COLUMNS).to_pandas()
+    return similar_df.set_index(KEY_COL, drop=False)
+
+@st.cache_resource(max_entries=4)
+def load_search_index(table_name, version):
+    snapshot = load_snapshot(table_name, version)
+    columns = [col for col in [*SEARCH_COLUMNS, "Specs"] if col in snapshot.column_names]
+    return SearchIndex.from_frame(snapshot.select(columns).to_pandas())
+
+@st.cache_resource(max_entries=2)
+def load_thumbnail_manifest(mtime):
+    return load_manifest()
+
+def thumbnail_manifest():
+    path = os.path.join(THUMB_DIR, MANIFEST_FILE)
+    return load_thumbnail_manifest(os.path.getmtime(path)) if os.path.exists(path) else {}
+
+def reset_page():
+    # A new page size changes the page count; start again from the first page
+    st.session_state.page_number = 1
+
+def with_count(value, col_counts):
+    return f"{value} ({col_counts[value]})" if value in col_counts else str(value)
 
 def render_best_sellers(gender):
     st.title(f" Best Sellers for {gender}")
-    table = "Final_Watch_Dataset_Men_output" if gender == "Men" else "Final_Watch_Dataset_Women_output"
-    df = load_data(table)
+    table = next(segment.final_output for segment in SEGMENTS if segment.gender == gender)
+    version = current_dataset_version()
+    if QUERY_MODE:
+        facet_index = load_catalog_summary(table, version)
+    else:
+        snapshot = load_snapshot(table, version)
+        facet_index = load_facet_index(table, version)
 
     if "filtered_df" in st.session_state:
         render_results(st.session_state.filtered_df)
+
+    search = st.text_input("🔎 Search products", placeholder="Brand, model number, name or spec (e.g. fossil sapphire)", key=f"{table}_search").strip()
+    search_hits = search_mask = None
+    if search and not QUERY_MODE:
+        # Ranked hits from the inverted index; the sidebar filters and counts apply on top
+        search_hits = load_search_index(table, version).search(search)
+        search_mask = facet_index.bitmap_from_positions(search_hits)
     
     st.sidebar.header("Filter Products")
 
+    # Widget values for this rerun are already in session_state, so the counts shown
+    # next to each option can reflect all the other active filters before rendering.
+    price_min, price_max = (int(bound) for bound in facet_index.bounds("Price"))
+    dia_min, dia_max = facet_index.bounds("Case Diameter (mm)")
+    show_diameter = dia_min is not None and dia_min < dia_max
+
+    selections = {
+        "price_band": [band for band in facet_index.values("price_band") if st.session_state.get(f"price_band_{band}")]
+    }
+    for col in FACETS:
+        selections[col] = st.session_state.get(f"{table}_{col}", [])
+    ranges = {"Price": st.session_state.get(f"{table}_price", (price_min, price_max))}
+    selected_diameter = st.session_state.get(f"{table}_diameter")
+    if show_diameter and selected_diameter and tuple(selected_diameter) != (float(dia_min), float(dia_max)):
+        ranges["Case Diameter (mm)"] = selected_diameter  # full range keeps listings without a diameter
+    counts = facet_index.facet_counts(selections, ranges, mask=search_mask)
+
     # 1. Price Band (Checkboxes)
     st.sidebar.markdown("**Price Band**")
-    df["price_band"] = df["price_band"].str.strip().str.upper()
-    price_band_options = sorted(df["price_band"].dropna().unique())
-    selected_priceband = []
-    for band in price_band_options:
-        if st.sidebar.checkbox(band, key=f"price_band_{band}"):
-            selected_priceband.append(band)
+    for band in facet_index.values("price_band"):
+        st.sidebar.checkbox(with_count(band, counts.get("price_band", {})), key=f"price_band_{band}")
 
     # 2. Price Range Slider
-    price_min, price_max = int(df["Price"].min()), int(df["Price"].max())
-    selected_price = st.sidebar.slider("Price Range", price_min, price_max, (price_min, price_max))
-
-    # 3. Brand
-    df["Brand"] = df["Brand"].str.strip().str.lower().str.title()
-    selected_brands = st.sidebar.multiselect("Brand", sorted(df["Brand"].dropna().unique()))
-
-    # 4. Dial Colour
-    df["Dial Colour"] = df["Dial Colour"].str.strip().str.lower().str.title()
-    selected_dialcol = st.sidebar.multiselect("Dial Colour", sorted(df["Dial Colour"].dropna().unique()))
+    st.sidebar.slider("Price Range", price_min, price_max, (price_min, price_max), key=f"{table}_price")
 
-    # 5. Dial Shape
-    df["Case Shape"] = df["Case Shape"].str.strip().str.lower().str.title()
-    selected_dialshape = st.sidebar.multiselect("Dial Shape", sorted(df["Case Shape"].dropna().unique()))
-    
-    # 6. Band Colour
-    df["Band Colour"] = df["Band Colour"].str.strip().str.lower().str.title()
-    selected_bandcol = st.sidebar.multiselect("Band Colour", sorted(df["Band Colour"].dropna().unique()))
-
-    # 7. Band Material
-    df["Band Material"] = df["Band Material"].str.strip().str.lower().str.title()
-    selected_bandmaterial = st.sidebar.multiselect("Band Material", sorted(df["Band Material"].dropna().unique()))
+    # 2b. Case Diameter Slider (numeric millimetre column written by the pipeline)
+    if show_diameter:
+        st.sidebar.slider("Case Diameter (mm)", float(dia_min), float(dia_max), (float(dia_min), float(dia_max)), key=f"{table}_diameter")
 
-    # 8. Movement
-    df["Movement"] = df["Movement"].str.strip().str.lower().str.title()
-    selected_movement = st.sidebar.multiselect("Movement", sorted(df["Movement"].dropna().unique()))
-    
-
-    # Apply filters
-    filtered_df = df.copy()
-    if selected_priceband:
-        filtered_df = filtered_df[filtered_df["price_band"].isin(selected_priceband)]
-    filtered_df = filtered_df[
-        (filtered_df["Price"] >= selected_price[0]) & (filtered_df["Price"] <= selected_price[1])
-    ]
-    if selected_brands:
-        filtered_df = filtered_df[filtered_df["Brand"].isin(selected_brands)]
-    if selected_dialcol:
-        filtered_df = filtered_df[filtered_df["Dial Colour"].isin(selected_dialcol)]
-    if selected_bandcol:
-        filtered_df = filtered_df[filtered_df["Band Colour"].isin(selected_bandcol)]
-    if selected_dialshape:
-        filtered_df = filtered_df[filtered_df["Case Shape"].isin(selected_dialshape)]
-    if selected_bandmaterial:
-        filtered_df = filtered_df[filtered_df["Band Material"].isin(selected_bandmaterial)]
-    if selected_movement:
-        filtered_df = filtered_df[filtered_df["Movement"].isin(selected_movement)]
+    # 3-8. Brand, Dial Colour, Dial Shape, Band Colour, Band Material, Movement
+    for col, label in FACETS.items():
+        st.sidebar.multiselect(
+            label,
+            facet_index.values(col),
+            format_func=lambda value, col_counts=counts.get(col, {}): with_count(value, col_counts),
+            key=f"{table}_{col}"
+        )
 
 # Pagination
-    items_per_page = 20
-    total_items = len(filtered_df)
-    total_pages = (total_items - 1) // items_per_page + 1
+    items_per_page = st.sidebar.selectbox("Products per page", PAGE_SIZES, key="items_per_page", on_change=reset_page)
     if "page_number" not in st.session_state:
         st.session_state.page_number = 1
     
     start_idx = (st.session_state.page_number - 1) * items_per_page
     end_idx = start_idx + items_per_page
-    paged_df = filtered_df.iloc[start_idx:end_idx]
+    if QUERY_MODE:
+        # Only the visible page leaves the database
+        paged_df, total_items = query_page(table, version, selections, ranges, search, st.session_state.page_number, items_per_page)
+    else:
+        # Apply filters (bitmap AND/OR over the prebuilt index)
+        positions = facet_index.match(selections, ranges, mask=search_mask)
+        if search_hits is not None:
+            positions = search_hits[np.isin(search_hits, positions)]  # relevance order
+        total_items = len(positions)
+        paged_df = snapshot.take(positions[start_idx:end_idx]).to_pandas()
+    total_pages = (total_items - 1) // items_per_page + 1
     
     if paged_df.empty:
         st.warning("No products found with selected filters.")
     else:
         st.markdown(f"**Showing {start_idx + 1}–{min(end_idx, total_items)} of {total_items} products**")
     
-        rows = list(paged_df.iterrows())
-        for i in range(0, len(rows), 4):
-            with st.container():
-                cols = st.columns(4)
-                for j in range(4):
-                    if i + j < len(rows):
-                        _, row = rows[i + j]
-                        with cols[j]:
-                            st.markdown(
-                                f"""
-                                <div style="border:1px solid #ddd; padding:20px; border-radius:10px;
-                                            box-shadow:0 2px 10px rgba(0,0,0,0.05); height:540px;
-                                            background-color:white; display:flex; flex-direction:column;
-                                            justify-content:space-between; width:100%;">
-                                    <div style='text-align:center'>
-                                        <a href="{row['URL']}" target="_blank">
-                                            <img src="{row['ImageURL']}" style="height:240px; object-fit:contain; margin:auto; margin-bottom:15px;" />
-                                        </a>
-                                    </div>
-                                    <div style="font-weight:600; font-size:1rem; margin-bottom:10px;
-                                                display: -webkit-box;
-                                                -webkit-line-clamp: 2;
-                                                -webkit-box-orient: vertical;
-                                                overflow: hidden;
-                                                text-align:center;
-                                                height:3em;">
-                                        {row['Product Name']}
-                                    </div>
-                                    <div style="font-size:0.95rem; line-height:1.6; text-align:left;">
-                                        <b>Brand:</b> {row['Brand']}<br>
-                                        <b>Model:</b> {row['Model Number']}<br>
-                                        <b>Price:</b> ₹{int(row['Price'])}<br>
-                                        <b>Rating:</b> {round(row['Ratings'], 1) if pd.notna(row['Ratings']) else "N/A"}/5<br>
-                                        <b>Discount:</b> {
-                                            "No" if pd.notna(row["Discount"]) and row["Discount"] in ["0", "0.0"]
-                                            else row["Discount"] if pd.notna(row["Discount"])
-                                            else "N/A"
-                                }
-                                    </div>
-                                </div>
-                                """,
-                                unsafe_allow_html=True
-                            )
-            st.markdown("<div style='height: 30px;'></div>", unsafe_allow_html=True)
-
-
-
+        # One HTML payload for the whole page of cards
+        paged_df = paged_df.assign(ImageURL=thumbnail_urls(paged_df["ImageURL"], thumbnail_manifest(), THUMBNAIL_BASE_URL))
+        st.markdown(render_grid_html(paged_df, similar_watches(table, version, paged_df)), unsafe_allow_html=True)
 
         # --- Pagination Controls ---
         st.markdown("<br>", unsafe_allow_html=True)
@@ -200,6 +268,6 @@ if "selected_gender" not in st.session_state:
     st.session_state.selected_gender = "Men"
 
 st.sidebar.markdown("### Gender Category")
-st.sidebar.radio("Select the Gender", ["Men", "Women"], key="selected_gender")
+st.sidebar.radio("Select the Gender", [segment.gender for segment in SEGMENTS], key="selected_gender")
 
 render_best_sellers(st.session_state.selected_gender)
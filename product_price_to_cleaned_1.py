@@ -2,6 +2,7 @@ import os
 import pandas as pd
 from sqlalchemy import create_engine
 from urllib.parse import quote_plus
+from listing_keys import add_listing_key, create_listing_key_index
 
 
 # ------------------------------------
@@ -210,6 +211,11 @@ try:
         raise KeyError("Required columns 'Product Name' and/or 'Product Price' not found.")
 
     df = df.dropna(subset=["product_name", "product_price"])
+
+    # Raw tables uploaded before the ASIN key existed still carry the full tracking link
+    if "source_url" not in df.columns:
+        df = add_listing_key(df, "product_url")
+
     df["product_code"] = df["product_name"].apply(extract_product_code)
     df["brand"] = df["product_name"].apply(extract_brand)
 
@@ -246,6 +252,9 @@ duplicates = grouped[grouped["Count"] > 1]
 
 print(duplicates)
 
+# Same ASIN listed more than once (sponsored + organic slots)
+df = df[df["asin"].isna() | ~df.duplicated(subset="asin", keep="first")]
+
 df = df.drop_duplicates(subset=["product_name", "product_code"], keep="first")
 
 df.loc[
@@ -254,7 +263,8 @@ df.loc[
     "product_code"
 ] = "1683NL01"
 
-df = df.drop(columns=["model_number", "asin","brand_name"])
+df = df.drop(columns=["model_number", "brand_name", "source_url"])
 
 df.to_sql("product_price_cleaned_output", con=engine, if_exists="replace", index=False)
+create_listing_key_index(engine, "product_price_cleaned_output")
 print("✅ Cleaned product_price saved as product_price_cleaned")
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------
+# Top-N segments
+# -------------------------------------
+# Each segment is one scraped Top 100 list. The Top-N stages run the same code for
+# every entry, so a new gender/category/marketplace is one more line here.
+
+@dataclass(frozen=True)
+class Segment:
+    gender: str
+    top100_table: str          # Top 100 export read by Separating_top100_pricewise.py
+    source_table: str          # Top 100 scrape with specs read by Attributes_top100.py
+    filled_table: str          # manually filled specs used as fallback
+    price_range_output: str
+    final_output: str
+    category: str = "Analog Watches"
+    marketplace: str = "amazon.in"
+
+    @property
+    def name(self):
+        return f"{self.marketplace}/{self.category}/{self.gender}"
+
+
+SEGMENTS = [
+    Segment(
+        gender="Men",
+        top100_table="top_100_men_excel",
+        source_table="top_100_men",
+        filled_table="top100_men_filled",
+        price_range_output="men_price_range_top100_output",
+        final_output="Final_Watch_Dataset_Men_output",
+    ),
+    Segment(
+        gender="Women",
+        top100_table="top_100_women_excel",
+        source_table="top_100_women",
+        filled_table="top100_women_filled",
+        price_range_output="women_price_range_top100_output",
+        final_output="Final_Watch_Dataset_Women_output",
+    ),
+]
+
+
+def run_segments(process, segments=SEGMENTS, max_workers=None):
+    """
+    Runs `process(segment)` for every segment on a thread pool (the stages are mostly
+    waiting on the database) and returns {segment.name: result}. Every segment runs to
+    completion before the first failure, if any, is re-raised.
+    """
+    results, errors = {}, []
+    with ThreadPoolExecutor(max_workers=max_workers or len(segments)) as pool:
+        futures = {segment.name: pool.submit(process, segment) for segment in segments}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+                print(f"✅ {name}: done")
+            except Exception as e:
+                print(f"❌ {name}: {e}")
+                errors.append(e)
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+# -------------------------------------
+# Shared rules
+# -------------------------------------
+PRICE_BINS = [-np.inf, 10000, 15000, 25000, 40000, np.inf]
+PRICE_LABELS = ["<10k", "10k–15k", "15k–25k", "25k–40k", "40k+"]
+
+def categorize_price(prices: pd.Series) -> pd.Series:
+    prices = pd.to_numeric(prices, errors="coerce")
+    bands = pd.cut(prices, bins=PRICE_BINS, labels=PRICE_LABELS, right=False)
+    return bands.astype(object).fillna("Unknown")
+
+
+def refine_brand(product_names: pd.Series, brands: pd.Series) -> pd.Series:
+    # Titan sub-brands are only visible in the product name
+    name = product_names.astype(str).str.lower()
+    is_titan = brands.astype(str).str.lower().str.contains("titan", regex=False)
+
+    refined = brands.copy()
+    refined = refined.mask(name.str.contains("raga", regex=False) & is_titan, "Titan Raga")
+    refined = refined.mask(name.str.contains("edge", regex=False) & is_titan, "Titan Edge")
+    refined = refined.mask(name.str.contains("xylys", regex=False), "Titan XYLYS")
+    return refined
+
+
+# Filterable columns of the final datasets. They are published already normalized so
+# dashboards and SQL can filter on them directly.
+FACET_COLUMNS = ["Brand", "Dial Colour", "Case Shape", "Band Colour", "Band Material", "Movement"]
+
+def normalize_facets(df: pd.DataFrame) -> pd.DataFrame:
+    for col in FACET_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].str.strip().str.lower().str.title()
+    if "price_band" in df.columns:
+        df["price_band"] = df["price_band"].str.strip().str.upper()
+    return df
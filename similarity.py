@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------
+# "More like this" neighbours
+# -------------------------------------
+# Computed once per publish: every listing becomes a feature vector (standardized
+# numeric specs + weighted one-hot categorical specs) and its nearest neighbours are
+# found with a blocked NumPy top-k. The result is stored as a "Similar Ranks" column,
+# so the dashboard looks neighbours up per card instead of scanning the catalog.
+
+# Column -> weight. Price is compared on a log scale (₹5k vs ₹10k ~ ₹50k vs ₹100k).
+NUMERIC_FEATURES = {
+    "Case Diameter (mm)": 1.0,
+    "Case Thickness (mm)": 0.7,
+    "Band Width (mm)": 0.5,
+    "Price": 1.5,
+}
+CATEGORICAL_FEATURES = {
+    "Movement": 1.0,
+    "Case Material": 0.7,
+    "Band Material": 0.7,
+    "Dial Colour": 0.5,
+    "Band Colour": 0.5,
+}
+LOG_FEATURES = {"Price"}
+
+SIMILAR_K = 6
+BLOCK_SIZE = 1024
+
+
+def feature_matrix(df: pd.DataFrame) -> np.ndarray:
+    blocks = []
+    for col, weight in NUMERIC_FEATURES.items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        if col in LOG_FEATURES:
+            values = np.log1p(np.clip(values, 0, None))
+        known = ~np.isnan(values)
+        if not known.any():
+            continue
+        std = values[known].std() or 1.0
+        # Missing values sit at the mean, so they neither attract nor repel
+        blocks.append(weight * np.where(known, (values - values[known].mean()) / std, 0.0)[:, None])
+
+    for col, weight in CATEGORICAL_FEATURES.items():
+        if col not in df.columns:
+            continue
+        values = df[col].astype("string").str.strip().str.lower().replace("", pd.NA)
+        one_hot = pd.get_dummies(values, dtype=float).to_numpy()
+        # Two different values are `weight` apart (squared distance weight**2)
+        blocks.append(one_hot * weight / np.sqrt(2))
+
+    if not blocks:
+        return np.zeros((len(df), 0), dtype=np.float32)
+    return np.hstack(blocks).astype(np.float32)
+
+
+def nearest_neighbors(features: np.ndarray, k=SIMILAR_K, block_size=BLOCK_SIZE) -> np.ndarray:
+    """
+    (n, k) row positions of each row's k nearest rows by Euclidean distance, closest
+    first and never the row itself. Distances are computed one block of rows at a time
+    so memory stays at block_size x n.
+    """
+    n = len(features)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64)
+
+    sq_norms = (features.astype(np.float64) ** 2).sum(axis=1)
+    neighbors = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = features[start:stop].astype(np.float64)
+        dist = sq_norms[start:stop, None] + sq_norms[None, :] - 2 * block @ features.T.astype(np.float64)
+        dist[np.arange(stop - start), np.arange(start, stop)] = np.inf  # exclude self
+
+        candidates = np.sort(np.argpartition(dist, k - 1, axis=1)[:, :k], axis=1)
+        order = np.argsort(np.take_along_axis(dist, candidates, axis=1), axis=1, kind="stable")
+        neighbors[start:stop] = np.take_along_axis(candidates, order, axis=1)  # ties -> better rank first
+    return neighbors
+
+
+def add_similar_ranks(df: pd.DataFrame, k=SIMILAR_K, key_col="Rank", similar_col="Similar Ranks") -> pd.DataFrame:
+    neighbors = nearest_neighbors(feature_matrix(df), k)
+    keys = df[key_col].to_numpy()
+    df[similar_col] = [keys[row].tolist() for row in neighbors]
+    print(f"🧭 Similar watches: {neighbors.shape[1]} neighbours for {len(df)} listings")
+    return df
@@ -2,6 +2,7 @@ import os
 import pandas as pd
 from sqlalchemy import create_engine
 from urllib.parse import quote_plus  # ✅ Needed for password encoding
+from listing_keys import add_listing_key, create_listing_key_index
 
 db = os.environ["SUPABASE_DB"]
 user = os.environ["SUPABASE_USER"]
@@ -30,7 +31,15 @@ for file in os.listdir("."):
 
             df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
             table_name = file.lower().replace(".xlsx", "").replace(".csv", "").replace(" ", "_")
+
+            # ✅ Compact ASIN key for joins/dedup; full tracking link kept in source_url
+            url_col = next((col for col in ["url", "product_url"] if col in df.columns), None)
+            if url_col:
+                df = add_listing_key(df, url_col)
+
             df.to_sql(table_name, engine, if_exists="replace", index=False)
+            if url_col:
+                create_listing_key_index(engine, table_name)
             print(f"✅ Uploaded: {table_name}")
         except Exception as e:
             print(f"❌ Failed to upload {file}: {e}")